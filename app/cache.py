@@ -0,0 +1,146 @@
+import inspect
+from collections import Counter
+from functools import wraps
+from typing import Optional, Tuple
+
+import orjson
+from fastapi import Request, Response
+from fastapi_cache import FastAPICache
+from fastapi_cache.backends import Backend
+from fastapi_cache.backends.inmemory import InMemoryBackend
+from pydantic import TypeAdapter
+from redis import asyncio as aioredis
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.conditional import is_not_modified
+from app.config import settings
+from app.dao.session import after_commit
+from app.logger import log
+from app.metrics import serialization_timer
+
+
+MAJORS_NAMESPACE = "majors"
+CACHE_PREFIX = "university"
+# Заголовки ответа, которые сохраняются вместе с телом и отдаются при попадании
+CACHED_HEADERS = ("ETag", "X-Next-Cursor", "Link")
+
+# Счётчики попаданий и промахов по пространствам имён: {("majors", "hit"): 10, ...}
+cache_stats: Counter = Counter()
+
+
+class RedisBackend(Backend):
+    # Бэкенд fastapi-cache2 поверх redis.asyncio: встроенный RedisBackend 0.1.8
+    # требует aioredis, который не импортируется на Python 3.11
+    def __init__(self, redis: aioredis.Redis):
+        self.redis = redis
+
+    async def get_with_ttl(self, key: str) -> Tuple[int, Optional[bytes]]:
+        async with self.redis.pipeline(transaction=True) as pipe:
+            return await pipe.ttl(key).get(key).execute()
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self.redis.get(key)
+
+    async def set(self, key: str, value: bytes, expire: int = None):
+        return await self.redis.set(key, value, ex=expire)
+
+    async def clear(self, namespace: str = None, key: str = None) -> int:
+        # SCAN вместо KEYS, чтобы не блокировать Redis на большом количестве ключей
+        if namespace:
+            keys = [k async for k in self.redis.scan_iter(match=f"{namespace}:*", count=500)]
+            return await self.redis.unlink(*keys) if keys else 0
+        if key:
+            return await self.redis.unlink(key)
+        return 0
+
+
+def init_cache() -> None:
+    if settings.REDIS_URL:
+        backend = RedisBackend(aioredis.from_url(settings.REDIS_URL))
+    else:
+        # Один процесс или тесты: кэш в памяти
+        backend = InMemoryBackend()
+    FastAPICache.init(backend, prefix=CACHE_PREFIX, expire=settings.CACHE_EXPIRE)
+
+
+def _cache_enabled() -> bool:
+    return FastAPICache._init and FastAPICache.get_enable()
+
+
+def build_key(namespace: str, request: Request) -> str:
+    # В ключ входят путь и все query-параметры (фильтры QueryParamsMajor, limit, after)
+    query = "&".join(f"{k}={v}" for k, v in sorted(request.query_params.multi_items()))
+    return f"{FastAPICache.get_prefix()}:{namespace}:{request.url.path}?{query}"
+
+
+def cache_response(namespace: str, expire: int | None = None):
+    # Кэширует уже сериализованный JSON ответа. Обработчик должен принимать request: Request.
+    # Ответ сериализуется по аннотации возвращаемого типа, как это сделал бы FastAPI.
+    # Декоратор ставится над conditional_get: попадание не требует запроса версии.
+    # Заголовки CACHED_HEADERS (ETag, курсор следующей страницы) хранятся вместе с телом
+    # в виде '{"ETag": ...}\n<тело>', по сохранённому ETag же отдаётся 304
+    def decorator(func):
+        adapter = TypeAdapter(inspect.signature(func).return_annotation)
+
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            request: Request = kwargs["request"]
+            if not _cache_enabled() or request.headers.get("Cache-Control") == "no-store":
+                return await func(*args, **kwargs)
+
+            backend = FastAPICache.get_backend()
+            key = build_key(namespace, request)
+            try:
+                cached = await backend.get(key)
+            except Exception as e:
+                # Недоступный кэш не должен ронять чтение: отвечаем из базы, не пытаясь записать
+                log.error(f"Не удалось прочитать кэш {key}: {e}")
+                return await func(*args, **kwargs)
+            if cached is not None:
+                cache_stats[(namespace, "hit")] += 1
+                # Сериализованный JSON не содержит переводов строки, первый отделяет заголовки
+                stored_headers, _, content = cached.partition(b"\n")
+                headers = {**orjson.loads(stored_headers), "X-Cache": "HIT"}
+                if "ETag" in headers and is_not_modified(request, headers["ETag"], None):
+                    return Response(status_code=304, headers=headers)
+                return Response(content=content, media_type="application/json", headers=headers)
+
+            cache_stats[(namespace, "miss")] += 1
+            result = await func(*args, **kwargs)
+            headers = {}
+            if isinstance(result, Response):
+                # Обработчик уже сериализовал ответ сам (быстрый путь) или ответил 304,
+                # кэшируем только успешный JSON
+                if result.status_code != 200 or result.media_type != "application/json":
+                    return result
+                content = result.body
+                headers = {name: result.headers[name] for name in CACHED_HEADERS if name in result.headers}
+            else:
+                with serialization_timer():
+                    content = adapter.dump_json(adapter.validate_python(result, from_attributes=True))
+            try:
+                await backend.set(key, orjson.dumps(headers) + b"\n" + content, expire or FastAPICache.get_expire())
+            except Exception as e:
+                log.error(f"Не удалось записать кэш {key}: {e}")
+            return Response(content=content, media_type="application/json", headers={**headers, "X-Cache": "MISS"})
+
+        return wrapper
+
+    return decorator
+
+
+async def clear_namespace(namespace: str) -> None:
+    if not _cache_enabled():
+        return
+    try:
+        await FastAPICache.clear(namespace=namespace)
+    except Exception as e:
+        log.error(f"Не удалось очистить кэш {namespace}: {e}")
+
+
+async def invalidate_on_commit(session: AsyncSession, namespace: str) -> None:
+    # Как и кэш справочников: очищаем сразу и ещё раз после commit, чтобы параллельный GET
+    # не закэшировал данные незафиксированной транзакции. Вторую очистку владелец сессии
+    # дожидается до отправки ответа, поэтому следующий запрос клиента не увидит старый кэш
+    await clear_namespace(namespace)
+    after_commit(session, f"cache:{namespace}", lambda: clear_namespace(namespace))
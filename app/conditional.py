@@ -0,0 +1,91 @@
+import hashlib
+import inspect
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from functools import wraps
+
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+
+from app.metrics import serialization_timer
+
+
+# Условные GET: ETag считается по версии ответа - кортежу из дешёвого запроса метаданных
+# (BaseDAO.page_version, BaseDAO.version) и query-параметров, поэтому 304 отдаётся без загрузки
+# и сериализации строк. Версия читается до самих данных: если запись изменится между двумя
+# запросами, ETag окажется старее тела и следующий запрос просто получит 200.
+# updated_at хранится без часового пояса в UTC (app.database.utcnow, utc_now)
+
+
+def make_etag(version: tuple, request: Request) -> str:
+    query = "&".join(f"{k}={v}" for k, v in sorted(request.query_params.multi_items()))
+    digest = hashlib.blake2b(repr((version, request.url.path, query)).encode(), digest_size=16)
+    return f'"{digest.hexdigest()}"'
+
+
+def last_modified(version: tuple) -> datetime | None:
+    moments = [value for value in version if isinstance(value, datetime)]
+    if not moments:
+        return None
+    moment = max(moments)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    # Last-Modified передаётся с точностью до секунды
+    return moment.replace(microsecond=0)
+
+
+def is_not_modified(request: Request, etag: str, modified: datetime | None) -> bool:
+    # If-None-Match важнее If-Modified-Since (RFC 9110, 13.2.2); для GET сравнение слабое
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        return etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is None or modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)
+    return modified <= since
+
+
+def conditional_get(version_of, use_last_modified: bool = True):
+    # version_of(**аргументы обработчика) -> версия ответа или None, если ресурса нет
+    # (тогда обработчик сам ответит 404). Обработчик должен принимать request: Request.
+    # Спискам use_last_modified не подходит: удаление строки не двигает max(updated_at),
+    # поэтому для них проверяется только ETag
+    def decorator(func):
+        adapter = TypeAdapter(inspect.signature(func).return_annotation)
+
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            request: Request = kwargs["request"]
+            version = await version_of(**kwargs)
+            if version is None:
+                return await func(*args, **kwargs)
+
+            etag = make_etag(version, request)
+            modified = last_modified(version) if use_last_modified else None
+            headers = {"ETag": etag}
+            if modified is not None:
+                headers["Last-Modified"] = format_datetime(modified, usegmt=True)
+            if is_not_modified(request, etag, modified):
+                return Response(status_code=304, headers=headers)
+
+            result = await func(*args, **kwargs)
+            if not isinstance(result, Response):
+                with serialization_timer():
+                    content = adapter.dump_json(adapter.validate_python(result, from_attributes=True))
+                result = Response(content=content, media_type="application/json")
+            if result.status_code == 200:
+                result.headers.update(headers)
+            return result
+
+        return wrapper
+
+    return decorator
@@ -1,5 +1,9 @@
 import os
-from pydantic_settings import BaseSettings, SettingsConfigDict
+from typing import Annotated
+from uuid import uuid4
+
+from pydantic import field_validator
+from pydantic_settings import BaseSettings, NoDecode, SettingsConfigDict
 
 
 class Settings(BaseSettings):
@@ -8,14 +12,106 @@ class Settings(BaseSettings):
     DB_NAME: str
     DB_USER: str
     DB_PASSWORD: str
+
+    # Пул соединений
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30
+    DB_POOL_RECYCLE: int = -1
+    DB_POOL_PRE_PING: bool = False
+
+    # Драйвер asyncpg и серверные таймауты (None - значение сервера)
+    DB_PREPARED_STATEMENT_CACHE_SIZE: int = 100
+    DB_PGBOUNCER: bool = False
+    DB_STATEMENT_TIMEOUT_MS: int | None = None
+    DB_IDLE_IN_TRANSACTION_TIMEOUT_MS: int | None = None
+
+    # Тесты и отладка: ленивая загрузка связей вне профиля DAO становится ошибкой
+    DB_RAISE_ON_LAZY_LOAD: bool = False
+
+    # Реплики для чтения: полные URL через запятую; пусто - всё читается с primary
+    DB_REPLICA_URLS: Annotated[list[str], NoDecode] = []
+    DB_REPLICA_RETRY_AFTER: float = 30
+    DB_READ_PRIMARY_STICKY_SECONDS: int = 5
+
+    # Кэш ответов: Redis, если задан REDIS_URL, иначе память процесса
+    REDIS_URL: str | None = None
+    CACHE_EXPIRE: int = 60
+
+    # Логи: уровень, JSON или текст, как часто писать traceback ожидаемых 4xx на маршрут
+    LOG_LEVEL: str = "INFO"
+    LOG_JSON: bool = True
+    LOG_4XX_TRACEBACK_INTERVAL: float = 60
+
+    # Заголовок Server-Timing с временем БД, пула и сериализации в каждом ответе
+    SERVER_TIMING_ENABLED: bool = True
+
+    # Диагностика SQL (app.diagnostics): порог медленного запроса (None - не писать),
+    # сколько одинаковых запросов за HTTP-запрос считать N+1, доля запросов с подсчётом отпечатков.
+    # QUERY_DIAGNOSTICS_STRICT для тестов: проверяется каждый запрос, N+1 - исключение
+    SLOW_QUERY_MS: float | None = 200
+    N_PLUS_ONE_THRESHOLD: int = 10
+    QUERY_DIAGNOSTICS_SAMPLE_RATE: float = 0.05
+    QUERY_DIAGNOSTICS_STRICT: bool = False
+
+    # Ранжировать GET /students/search по word_similarity из pg_trgm. Без расширения
+    # (миграция 9a4f2d6b0e17 тогда пропускает индекс) нужно False: поиск идёт ILIKE
+    # полным просмотром, выше ставятся совпадения по началу фамилии, имени или email
+    SEARCH_TRGM: bool = True
+
+    # Сколько id можно запросить одним GET/POST /students/batch
+    STUDENTS_BATCH_MAX_IDS: int = 1000
+
+    # Фоновые задачи (app.jobs): размер общего пула, как часто отмечать выполняющиеся задачи,
+    # через сколько секунд без отметки задача считается упавшей
+    JOB_WORKERS: int = 4
+    JOB_HEARTBEAT_INTERVAL: float = 10
+    JOB_STALE_AFTER: float = 60
+
+    REFERENCE_CACHE_TTL: float = 300
+    COUNTER_FOLD_INTERVAL: float = 5
     model_config = SettingsConfigDict(
         env_file=os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", ".env")
     )
 
+    @field_validator("DB_REPLICA_URLS", mode="before")
+    @classmethod
+    def split_replica_urls(cls, value):
+        if isinstance(value, str):
+            return [url.strip() for url in value.split(",") if url.strip()]
+        return value
+
 
 settings = Settings()
 
 
 def get_db_url():
+    # PgBouncer в режиме transaction/statement не поддерживает серверные prepared statements
+    cache_size = 0 if settings.DB_PGBOUNCER else settings.DB_PREPARED_STATEMENT_CACHE_SIZE
     return (f"postgresql+asyncpg://{settings.DB_USER}:{settings.DB_PASSWORD}@"
-            f"{settings.DB_HOST}:{settings.DB_PORT}/{settings.DB_NAME}")
\ No newline at end of file
+            f"{settings.DB_HOST}:{settings.DB_PORT}/{settings.DB_NAME}"
+            f"?prepared_statement_cache_size={cache_size}")
+
+
+def get_engine_options() -> dict:
+    server_settings = {}
+    if settings.DB_STATEMENT_TIMEOUT_MS is not None:
+        server_settings["statement_timeout"] = str(settings.DB_STATEMENT_TIMEOUT_MS)
+    if settings.DB_IDLE_IN_TRANSACTION_TIMEOUT_MS is not None:
+        server_settings["idle_in_transaction_session_timeout"] = str(settings.DB_IDLE_IN_TRANSACTION_TIMEOUT_MS)
+
+    connect_args: dict = {"server_settings": server_settings}
+    if settings.DB_PGBOUNCER:
+        # Отключаем кэш asyncpg и даём безымянным statement уникальные имена,
+        # чтобы они не конфликтовали на разных серверных соединениях PgBouncer
+        connect_args["statement_cache_size"] = 0
+        connect_args["prepared_statement_name_func"] = lambda: f"__asyncpg_{uuid4()}__"
+
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "connect_args": connect_args,
+    }
@@ -0,0 +1,140 @@
+import asyncio
+from collections import Counter
+from typing import NamedTuple
+
+from sqlalchemy import func, insert, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app.counters.models import EnrollmentDelta
+from app.dao.session import session_scope
+from app.logger import log
+
+
+# Одним запросом переносим накопленные изменения в majors/institutes и сводку enrollment_stats
+# и удаляем их из журнала. Параллельная свёртка в другом процессе не задвоит суммы:
+# строку журнала удаляет только один DELETE. Вместе со счётчиком специальности меняется
+# counts_updated_at, а не updated_at - по нему считаются ETag ответов /majors (app.conditional)
+FOLD_DELTAS_SQL = text("""
+    WITH moved AS (
+        DELETE FROM enrollment_deltas
+        RETURNING major_id, institute_id, course, enrollment_year, delta
+    ),
+    majors_updated AS (
+        UPDATE majors
+        SET count_students = greatest(majors.count_students + d.delta, 0), counts_updated_at = timezone('utc', now())
+        FROM (SELECT major_id, sum(delta) AS delta FROM moved GROUP BY major_id) AS d
+        WHERE majors.id = d.major_id
+    ),
+    institutes_updated AS (
+        UPDATE institutes
+        SET count_students = greatest(institutes.count_students + d.delta, 0)
+        FROM (SELECT institute_id, sum(delta) AS delta FROM moved GROUP BY institute_id) AS d
+        WHERE institutes.id = d.institute_id
+    )
+    INSERT INTO enrollment_stats (major_id, institute_id, course, enrollment_year, students)
+    SELECT major_id, institute_id, course, enrollment_year, greatest(sum(delta), 0)
+    FROM moved
+    GROUP BY major_id, institute_id, course, enrollment_year
+    ON CONFLICT (major_id, institute_id, course, enrollment_year) DO UPDATE
+    SET students = greatest(enrollment_stats.students + excluded.students, 0), updated_at = timezone('utc', now())
+""")
+
+# Полный пересчёт по таблице students, например после массовой загрузки в обход DAO.
+# Журнал очищается в той же транзакции: после пересчёта его записи уже учтены
+REBUILD_COUNTS_SQL = (
+    text("""
+        UPDATE majors
+        SET count_students = coalesce(c.total, 0), counts_updated_at = timezone('utc', now())
+        FROM majors AS m
+        LEFT JOIN (SELECT major_id, count(*) AS total FROM students GROUP BY major_id) AS c
+            ON c.major_id = m.id
+        WHERE majors.id = m.id
+    """),
+    text("""
+        UPDATE institutes
+        SET count_students = coalesce(c.total, 0)
+        FROM institutes AS i
+        LEFT JOIN (SELECT institute_id, count(*) AS total FROM students GROUP BY institute_id) AS c
+            ON c.institute_id = i.id
+        WHERE institutes.id = i.id
+    """),
+    text("DELETE FROM enrollment_stats"),
+    text("""
+        INSERT INTO enrollment_stats (major_id, institute_id, course, enrollment_year, students)
+        SELECT major_id, institute_id, course, enrollment_year, count(*)
+        FROM students
+        GROUP BY major_id, institute_id, course, enrollment_year
+    """),
+    text("DELETE FROM enrollment_deltas"),
+)
+
+
+class EnrollmentKey(NamedTuple):
+    # Всё, что определяет место студента в счётчиках и сводке
+    major_id: int
+    institute_id: int
+    course: int
+    enrollment_year: int
+
+
+class CounterDAO:
+    model = EnrollmentDelta
+
+    @classmethod
+    async def record(cls, key: EnrollmentKey, delta: int, session: AsyncSession | None = None) -> None:
+        await cls.record_many(Counter({key: delta}), session=session)
+
+    @classmethod
+    async def record_many(cls, deltas: Counter, session: AsyncSession | None = None) -> None:
+        # deltas: {EnrollmentKey(major_id, institute_id, course, enrollment_year): delta}
+        rows = [EnrollmentKey(*key)._asdict() | {"delta": delta} for key, delta in deltas.items() if delta]
+        if not rows:
+            return
+        async with session_scope(session) as session:
+            await session.execute(insert(cls.model).values(rows))
+
+    @classmethod
+    async def pending(cls, column, ids: list[int], session: AsyncSession) -> dict[int, int]:
+        if not ids:
+            return {}
+        result = await session.execute(
+            select(column, func.sum(cls.model.delta))
+            .where(column.in_(ids))
+            .group_by(column)
+        )
+        return {entity_id: int(delta) for entity_id, delta in result.all()}
+
+    @classmethod
+    async def apply_pending(cls, objects, column, session: AsyncSession):
+        # Добавляем к count_students ещё не свёрнутые изменения. set_committed_value
+        # не помечает объект изменённым, поэтому при commit значение не запишется в БД
+        pending = await cls.pending(column, [obj.id for obj in objects], session)
+        for obj in objects:
+            if obj.id in pending:
+                set_committed_value(obj, "count_students", max(obj.count_students + pending[obj.id], 0))
+        return objects
+
+    @classmethod
+    async def fold(cls, session: AsyncSession | None = None) -> None:
+        async with session_scope(session) as session:
+            await session.execute(FOLD_DELTAS_SQL)
+
+    @classmethod
+    async def rebuild(cls, session: AsyncSession | None = None) -> None:
+        # Блокировка журнала не даёт параллельным записям добавить изменение,
+        # которое пересчёт уже учтёт, а DELETE затем удалит
+        async with session_scope(session) as session:
+            await session.execute(text("LOCK TABLE enrollment_deltas IN EXCLUSIVE MODE"))
+            for statement in REBUILD_COUNTS_SQL:
+                await session.execute(statement)
+
+
+async def fold_periodically(interval: float) -> None:
+    # Фоновая задача приложения: свёртка журнала раз в interval секунд
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await CounterDAO.fold()
+        except Exception as e:
+            log.error(f"Ошибка свёртки счётчиков студентов: {e}")
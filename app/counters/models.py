@@ -0,0 +1,51 @@
+from sqlalchemy import BigInteger, Index, Integer, text
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.database import Base
+
+
+class EnrollmentDelta(Base):
+    # Журнал изменений count_students: запись студента добавляет строку вместо
+    # UPDATE горячих строк majors/institutes, фоновая свёртка переносит суммы в счётчики.
+    # Внешних ключей нет намеренно, чтобы несвёрнутые строки не мешали удалению специальностей
+    __tablename__ = "enrollment_deltas"
+
+    id: Mapped[int] = mapped_column(BigInteger().with_variant(Integer, "sqlite"), primary_key=True)
+    major_id: Mapped[int]
+    institute_id: Mapped[int]
+    # Курс и год поступления нужны свёртке сводки enrollment_stats
+    course: Mapped[int]
+    enrollment_year: Mapped[int]
+    delta: Mapped[int]
+
+    __table_args__ = (
+        Index("ix_enrollment_deltas_major_id", "major_id"),
+        Index("ix_enrollment_deltas_institute_id", "institute_id"),
+    )
+
+    def __str__(self):
+        return (f"{self.__class__.__name__}(major_id={self.major_id}, "
+                f"institute_id={self.institute_id}, delta={self.delta})")
+
+    def __repr__(self):
+        return str(self)
+
+
+class EnrollmentStat(Base):
+    # Сводка для GET /stats/enrollment: количество студентов в каждой комбинации
+    # специальности, института, курса и года поступления. Строк здесь сотни, а не миллионы;
+    # обновляется той же свёрткой журнала enrollment_deltas, что и count_students
+    __tablename__ = "enrollment_stats"
+
+    major_id: Mapped[int] = mapped_column(primary_key=True)
+    institute_id: Mapped[int] = mapped_column(primary_key=True)
+    course: Mapped[int] = mapped_column(primary_key=True)
+    enrollment_year: Mapped[int] = mapped_column(primary_key=True)
+    students: Mapped[int] = mapped_column(server_default=text('0'))
+
+    def __str__(self):
+        return (f"{self.__class__.__name__}(major_id={self.major_id}, institute_id={self.institute_id}, "
+                f"course={self.course}, enrollment_year={self.enrollment_year}, students={self.students})")
+
+    def __repr__(self):
+        return str(self)
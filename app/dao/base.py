@@ -1,93 +1,228 @@
 from sqlalchemy import delete as sqlalchemy_delete
 from sqlalchemy import update as sqlalchemy_update
-from sqlalchemy import select
-from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy.orm import selectinload
-from app.database import async_session_maker
+from sqlalchemy import func, select
+from sqlalchemy.exc import MultipleResultsFound
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import raiseload
+from app.config import settings
+from app.dao.pagination import decode_cursor
+from app.dao.session import session_scope
+from app.exceptions import BadRequestError
 
 
+# Каждый метод принимает необязательную session: в обработчиках передаётся сессия
+# запроса (SessionDep), и все вызовы DAO идут в одной транзакции; без неё метод
+# открывает собственную сессию, как и раньше
 class BaseDAO:
     model = None
 
-    # Если фильтры не указаны, то будут возвращены все значения
+    # Профили загрузки связей: имя -> опции загрузчика (joinedload, selectinload, raiseload).
+    # find_all по умолчанию использует "list", find_one и find_one_or_none - "detail";
+    # профиль, не объявленный в DAO, ничего не подгружает
+    load_profiles: dict[str, tuple] = {}
+
+    # Поля для fields=, которых нет среди колонок модели или которые считаются иначе:
+    # имя -> (SQL-выражение, связь для join или None)
+    extra_fields: dict = {}
+
+    # Колонки, от которых зависит ответ о записи помимо её updated_at (например, updated_at
+    # специальности студента - в ответе есть её название): (SQL-выражение, связь для join или None).
+    # Берутся для каждой записи, поэтому изменение одной специальности не трогает чужих студентов
+    version_columns: tuple = ()
+
+    # Скалярные подзапросы, от которых зависит ответ целиком (например, журнал счётчиков).
+    # Добавляются к версии для ETag
+    version_dependencies: tuple = ()
+
+    @classmethod
+    def field_names(cls) -> set[str]:
+        return set(cls.model.__table__.columns.keys()) | set(cls.extra_fields)
+
+    @classmethod
+    def parse_fields(cls, raw: str | None) -> list[str] | None:
+        # "id,first_name,course" -> ["id", "first_name", "course"]; None - все поля
+        if not raw:
+            return None
+        fields = list(dict.fromkeys(f.strip() for f in raw.split(",") if f.strip()))
+        unknown = [f for f in fields if f not in cls.field_names()]
+        if unknown:
+            raise BadRequestError(f"Неизвестные поля: {', '.join(unknown)}")
+        return fields
+
+    @classmethod
+    def _filter_conditions(cls, **filter_by) -> list:
+        return [getattr(cls.model, key) == value for key, value in filter_by.items()]
+
     @classmethod
-    async def find_all(cls, **filter_by):
-        async with async_session_maker() as session:
+    def loader_options(cls, profile: str) -> tuple:
+        if profile not in ("list", "detail") and profile not in cls.load_profiles:
+            raise ValueError(f"У {cls.__name__} нет профиля загрузки {profile!r}")
+        options = cls.load_profiles.get(profile, ())
+        if settings.DB_RAISE_ON_LAZY_LOAD:
+            # Тестовый режим: любая ленивая загрузка связи, не описанная в профиле, - ошибка
+            options = (*options, raiseload("*"))
+        return options
+
+    @classmethod
+    def _select(cls, fields: list[str] | None = None, profile: str = "list"):
+        if fields:
+            return cls._select_fields(fields)
+        return select(cls.model).options(*cls.loader_options(profile))
+
+    @classmethod
+    def _select_fields(cls, fields: list[str]):
+        # Разреженная выборка: только запрошенные колонки, без ORM-объектов и связей;
+        # id нужен всегда - по нему строится курсор
+        columns = []
+        joins = []
+        for name in ["id", *(f for f in fields if f != "id")]:
+            if name in cls.extra_fields:
+                expression, relationship = cls.extra_fields[name]
+                columns.append(expression.label(name))
+                if relationship is not None and relationship not in joins:
+                    joins.append(relationship)
+            else:
+                columns.append(getattr(cls.model, name))
+        query = select(*columns).select_from(cls.model)
+        for relationship in joins:
+            query = query.outerjoin(relationship)
+        return query
+
+    @staticmethod
+    def _rows(result, fields: list[str] | None):
+        return result.mappings().all() if fields else result.scalars().all()
+
+    # Если фильтры не указаны, то будут возвращены все значения.
+    # limit/after включают keyset-пагинацию по id: after - курсор последней
+    # полученной записи, поэтому скорость не зависит от глубины страницы.
+    # С fields возвращаются словари только с этими полями
+    @classmethod
+    async def find_all(cls, limit: int | None = None, after: str | None = None, fields: list[str] | None = None,
+                       profile: str = "list", session: AsyncSession | None = None, **filter_by):
+        async with session_scope(session, read_only=True) as session:
             query = (
-                select(cls.model)
-                .options(selectinload(cls.model.major))
-                .filter_by(**filter_by)
+                cls._select(fields, profile)
+                .where(*cls._filter_conditions(**filter_by))
+                .order_by(cls.model.id)
             )
+            if after is not None:
+                query = query.where(cls.model.id > decode_cursor(after))
+            if limit is not None:
+                query = query.limit(limit)
             result = await session.execute(query)
-            return result.scalars().all()
+            return cls._rows(result, fields)
 
 
     @classmethod
-    async def find_one(cls, **filter_by):
-        async with async_session_maker() as session:
-            query = (
-                select(cls.model)
-                .options(selectinload(cls.model.major))
-                .filter_by(**filter_by)
-            )
+    async def find_one(cls, profile: str = "detail", session: AsyncSession | None = None, **filter_by):
+        async with session_scope(session, read_only=True) as session:
+            query = cls._select(profile=profile).where(*cls._filter_conditions(**filter_by))
             result = await session.execute(query)
             return result.scalar_one()
 
 
     @classmethod
-    async def find_one_or_none(cls, **filter_by):
-        async with async_session_maker() as session:
-            query = (
-                select(cls.model)
-                .options(selectinload(cls.model.major))
-                .filter_by(**filter_by)
-            )
+    async def find_one_or_none(cls, fields: list[str] | None = None, profile: str = "detail",
+                               session: AsyncSession | None = None, **filter_by):
+        async with session_scope(session, read_only=True) as session:
+            query = cls._select(fields, profile).where(*cls._filter_conditions(**filter_by))
             result = await session.execute(query)
-            return result.scalars().one_or_none()
+            rows = cls._rows(result, fields)
+            if len(rows) > 1:
+                raise MultipleResultsFound("Найдено больше одной записи")
+            return rows[0] if rows else None
+        
+
+    # Версии для условных GET (app.conditional) считаются по id и updated_at без загрузки строк.
+    # page_version описывает ту же страницу, что и find_all с теми же аргументами:
+    # количество строк, последний id и max(updated_at) - удаление, вставка в неполную
+    # страницу и изменение строки меняют хотя бы одно из них
+    @classmethod
+    def _version_select(cls):
+        columns = [cls.model.id, cls.model.updated_at]
+        joins = []
+        for index, (expression, relationship) in enumerate(cls.version_columns):
+            columns.append(expression.label(f"version_{index}"))
+            if relationship is not None and relationship not in joins:
+                joins.append(relationship)
+        query = select(*columns).select_from(cls.model)
+        for relationship in joins:
+            query = query.outerjoin(relationship)
+        return query
+
+    @classmethod
+    async def page_version(cls, limit: int | None = None, after: str | None = None,
+                           session: AsyncSession | None = None, **filter_by) -> tuple:
+        page = (
+            cls._version_select()
+            .where(*cls._filter_conditions(**filter_by))
+            .order_by(cls.model.id)
+        )
+        if after is not None:
+            page = page.where(cls.model.id > decode_cursor(after))
+        if limit is not None:
+            page = page.limit(limit)
+        page = page.subquery()
+        query = select(
+            func.count(), func.max(page.c.id), func.max(page.c.updated_at),
+            *(func.max(page.c[f"version_{index}"]) for index in range(len(cls.version_columns))),
+            *cls.version_dependencies,
+        )
+        async with session_scope(session, read_only=True) as session:
+            result = await session.execute(query.select_from(page))
+            return tuple(result.one())
+
+
+    @classmethod
+    async def version(cls, session: AsyncSession | None = None, **filter_by) -> tuple | None:
+        # Версия одной записи: id, updated_at и version_columns; None, если записи нет
+        query = (
+            cls._version_select()
+            .add_columns(*cls.version_dependencies)
+            .where(*cls._filter_conditions(**filter_by))
+        )
+        async with session_scope(session, read_only=True) as session:
+            result = await session.execute(query)
+            row = result.first()
+            return tuple(row) if row is not None else None
         
 
     @classmethod
-    async def add(cls, **values):
-        async with async_session_maker() as session:
-            async with session.begin():
-                new_instance = cls.model(**values)
-                session.add(new_instance)
-                try:
-                    await session.commit()
-                except SQLAlchemyError as e:
-                    await session.rollback()
-                    raise e
-                return new_instance
+    async def add(cls, session: AsyncSession | None = None, **values):
+        async with session_scope(session) as session:
+            new_instance = cls.model(**values)
+            session.add(new_instance)
+            # flush отправляет INSERT сразу, commit делает владелец транзакции
+            await session.flush()
+            return new_instance
 
 
     @classmethod
-    async def update(cls, filter_by: dict, **values):
-        async with async_session_maker() as session:
-            async with session.begin():
-                stmt = (
-                    sqlalchemy_update(cls.model)
-                    .where(*[getattr(cls.model, k) == v for k, v in filter_by.items()])
-                    .values(**values)
-                    .returning(cls.model)
-                )
-                result = await session.execute(stmt)
-                return result.scalars().one_or_none()
+    async def update(cls, filter_by: dict, session: AsyncSession | None = None, **values):
+        async with session_scope(session) as session:
+            stmt = (
+                sqlalchemy_update(cls.model)
+                .where(*[getattr(cls.model, k) == v for k, v in filter_by.items()])
+                .values(**values)
+                .returning(cls.model)
+            )
+            result = await session.execute(stmt)
+            return result.scalars().one_or_none()
 
     
     @classmethod
-    async def delete(cls, delete_all: bool = False, **filter_by):
+    async def delete(cls, delete_all: bool = False, session: AsyncSession | None = None, **filter_by):
         if not delete_all and not filter_by:
             raise ValueError("Необходимо указать хотя бы один параметр для удаления")
 
-        async with async_session_maker() as session:
-            async with session.begin():
-                query = (
-                    sqlalchemy_delete(cls.model)
-                    .filter_by(**filter_by)
-                    .returning(cls.model)
-                )
-                result = await session.execute(query)
-                deleted_objects = result.scalars().all()
-                deleted_count = len(deleted_objects)
-                return deleted_objects, deleted_count         
+        async with session_scope(session) as session:
+            query = (
+                sqlalchemy_delete(cls.model)
+                .filter_by(**filter_by)
+                .returning(cls.model)
+            )
+            result = await session.execute(query)
+            deleted_objects = result.scalars().all()
+            deleted_count = len(deleted_objects)
+            return deleted_objects, deleted_count         
 
@@ -0,0 +1,44 @@
+import base64
+import json
+from collections.abc import Mapping
+
+from app.exceptions import BadRequestError
+
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Списки без limit отвечают в прежнем формате - массивом, но тоже постранично:
+# первые DEFAULT_PAGE_SIZE строк, курсор следующей страницы - в заголовках X-Next-Cursor и Link
+LIMIT_DESCRIPTION = (f"Размер страницы. С limit ответ - объект с next_cursor, без него - массив "
+                     f"из {DEFAULT_PAGE_SIZE} строк, курсор следующей страницы в заголовке X-Next-Cursor")
+
+
+def encode_cursor(last_id: int) -> str:
+    # Курсор непрозрачен для клиента: base64 от json с последним id страницы
+    raw = json.dumps({"id": last_id}, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        last_id = json.loads(base64.urlsafe_b64decode(padded))["id"]
+    except (ValueError, KeyError, TypeError):
+        raise BadRequestError("Некорректный курсор пагинации")
+    if not isinstance(last_id, int):
+        raise BadRequestError("Некорректный курсор пагинации")
+    return last_id
+
+
+def next_cursor(items, limit: int | None) -> str | None:
+    # Если страница заполнена целиком, то возможно есть следующая
+    if not limit or len(items) < limit:
+        return None
+    last = items[-1]
+    # Строки разреженной выборки (fields=) - словари, а не ORM-объекты
+    return encode_cursor(last["id"] if isinstance(last, Mapping) else last.id)
+
+
+def page_size(limit: int | None) -> int:
+    return DEFAULT_PAGE_SIZE if limit is None else limit
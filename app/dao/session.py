@@ -0,0 +1,157 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Annotated, AsyncIterator, Awaitable, Callable
+
+from fastapi import Depends, Request, Response
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.config import settings
+from app.database import async_session_maker, replica_session_makers
+from app.logger import current_request_scope, log
+
+
+READ_PRIMARY_COOKIE = "read_primary"
+READ_CONSISTENCY_HEADER = "X-Read-Consistency"
+
+
+# Реплики выбираются по кругу; реплика, к которой не удалось подключиться,
+# исключается на retry_after секунд, а если живых реплик нет - читаем с primary
+class ReplicaPool:
+    def __init__(self, session_makers: list[async_sessionmaker], retry_after: float):
+        self.session_makers = session_makers
+        self.retry_after = retry_after
+        self._unhealthy_until = [0.0] * len(session_makers)
+        self._next = 0
+
+    def _candidates(self) -> list[int]:
+        count = len(self.session_makers)
+        if not count:
+            return []
+        start = self._next
+        self._next = (start + 1) % count
+        now = time.monotonic()
+        order = ((start + shift) % count for shift in range(count))
+        return [index for index in order if self._unhealthy_until[index] <= now]
+
+    def mark_unhealthy(self, index: int) -> None:
+        self._unhealthy_until[index] = time.monotonic() + self.retry_after
+
+    async def connect(self) -> AsyncSession | None:
+        for index in self._candidates():
+            session = self.session_makers[index]()
+            try:
+                # Берём соединение сразу, чтобы переключиться на другую реплику до выполнения запросов
+                await session.connection()
+                return session
+            except (DBAPIError, OSError, asyncio.TimeoutError) as e:
+                await session.close()
+                self.mark_unhealthy(index)
+                log.warning(f"Реплика #{index} недоступна, исключена на {self.retry_after} с: {e}")
+        return None
+
+
+replica_pool = ReplicaPool(replica_session_makers, retry_after=settings.DB_REPLICA_RETRY_AFTER)
+
+
+def after_commit(session: AsyncSession, key: str, callback: Callable[[], Awaitable]) -> None:
+    # Действие после commit (например, очистка кэша ответов), которое владелец транзакции
+    # дожидается до отправки ответа. Повторная регистрация с тем же key заменяет прежнюю
+    session.info.setdefault("after_commit", {})[key] = callback
+
+
+async def _run_after_commit(session: AsyncSession) -> None:
+    for callback in session.info.pop("after_commit", {}).values():
+        await callback()
+
+
+def _mark_read_primary() -> None:
+    # Запрос что-то записал в primary: ReadPrimaryMiddleware поставит cookie на его ответ
+    scope = current_request_scope()
+    if scope is not None and replica_session_makers:
+        scope.setdefault("state", {})["read_primary"] = True
+
+
+@asynccontextmanager
+async def session_scope(session: AsyncSession | None = None,
+                        read_only: bool = False) -> AsyncIterator[AsyncSession]:
+    # Если сессия передана снаружи (сессия запроса), то транзакцией управляет её владелец,
+    # иначе открываем собственную сессию и транзакцию на время вызова DAO.
+    # read_only=True разрешает чтение с реплики
+    if session is not None:
+        yield session
+        return
+    if read_only:
+        replica_session = await replica_pool.connect()
+        if replica_session is not None:
+            async with replica_session:
+                yield replica_session
+            return
+    async with async_session_maker() as new_session:
+        async with new_session.begin():
+            yield new_session
+        await _run_after_commit(new_session)
+    if not read_only:
+        _mark_read_primary()
+
+
+async def get_session() -> AsyncIterator[AsyncSession]:
+    # Одна сессия и одна транзакция на весь запрос: commit при успешном завершении обработчика,
+    # rollback при исключении
+    async with async_session_maker() as session:
+        async with session.begin():
+            yield session
+        await _run_after_commit(session)
+    _mark_read_primary()
+
+
+async def get_primary_read_session() -> AsyncIterator[AsyncSession]:
+    # Чтение с primary в транзакции READ ONLY: для данных, которых на реплике может ещё не быть
+    # (например, статус только что поставленной задачи). Cookie read_primary не ставится -
+    # запрос ничего не меняет
+    async with async_session_maker() as session:
+        async with session.begin():
+            # Параметр применяется при получении соединения, до начала транзакции в базе
+            await session.connection(execution_options={"postgresql_readonly": True})
+            yield session
+
+
+async def get_read_session(request: Request) -> AsyncIterator[AsyncSession]:
+    read_primary = (
+        READ_PRIMARY_COOKIE in request.cookies
+        or request.headers.get(READ_CONSISTENCY_HEADER, "").lower() == "primary"
+    )
+    async with session_scope(read_only=not read_primary) as session:
+        yield session
+
+
+class ReadPrimaryMiddleware:
+    # Cookie закрепляет следующие чтения клиента за primary, чтобы он видел свои изменения,
+    # пока реплики догоняют. Ставится на любой ответ запроса, который записал в primary
+    # (через SessionDep или session_scope), в том числе на ответ, возвращённый обработчиком
+    # самостоятельно (JSONResponse, 202 фоновой задачи)
+    def __init__(self, app):
+        self.app = app
+        cookie = Response()
+        cookie.set_cookie(READ_PRIMARY_COOKIE, "1", max_age=settings.DB_READ_PRIMARY_STICKY_SECONDS, httponly=True)
+        self.header = next(header for header in cookie.raw_headers if header[0] == b"set-cookie")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not replica_session_makers:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and scope.get("state", {}).get("read_primary"):
+                message = {**message, "headers": [*message.get("headers", []), self.header]}
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+
+# scope="function" - транзакция фиксируется до отправки ответа, поэтому ошибка commit
+# не превращается в успешный ответ клиенту
+SessionDep = Annotated[AsyncSession, Depends(get_session, scope="function")]
+ReadSessionDep = Annotated[AsyncSession, Depends(get_read_session, scope="function")]
+PrimaryReadSessionDep = Annotated[AsyncSession, Depends(get_primary_read_session, scope="function")]
@@ -1,21 +1,45 @@
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import Annotated
 
 from sqlalchemy import func
 from sqlalchemy.ext.asyncio import AsyncAttrs, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import DeclarativeBase, Mapped, declared_attr, mapped_column
 
-from app.config import get_db_url
+from app.config import get_db_url, get_engine_options, settings
+from app.diagnostics import watch_engine
+from app.metrics import TimedQueuePool, instrument_engine
 
 
 DATABASE_URL = get_db_url()
-engine = create_async_engine(DATABASE_URL)
+engine = create_async_engine(DATABASE_URL, poolclass=TimedQueuePool, **get_engine_options())
 async_session_maker = async_sessionmaker(engine, expire_on_commit=False)
 
+# Сессии реплик только для чтения, маршрутизация - в app.dao.session
+replica_engines = [
+    create_async_engine(url, poolclass=TimedQueuePool, **get_engine_options()) for url in settings.DB_REPLICA_URLS
+]
+replica_session_makers = [async_sessionmaker(e, expire_on_commit=False) for e in replica_engines]
+
+# Количество и время SQL-запросов для метрик запроса (app.metrics),
+# медленные запросы и N+1 (app.diagnostics)
+for _engine in (engine, *replica_engines):
+    instrument_engine(_engine)
+    watch_engine(_engine)
+
+
+def utcnow() -> datetime:
+    # Время в колонках хранится без часового пояса и всегда в UTC - так же пишет utc_now() в базе
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def utc_now():
+    # now() возвращает время в часовом поясе сессии, timezone('utc', ...) приводит его к UTC
+    return func.timezone("utc", func.now())
+
 
 int_pk = Annotated[int, mapped_column(primary_key=True)]
-created_at = Annotated[datetime, mapped_column(server_default=func.now())]
-updated_at = Annotated[datetime, mapped_column(server_default=func.now(), onupdate=datetime.now)]
+created_at = Annotated[datetime, mapped_column(server_default=utc_now())]
+updated_at = Annotated[datetime, mapped_column(server_default=utc_now(), onupdate=utcnow)]
 str_uniq = Annotated[str, mapped_column(unique=True, nullable=False)]
 str_null_true = Annotated[str, mapped_column(nullable=True)]
 
@@ -0,0 +1,162 @@
+import random
+import re
+import sys
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from functools import lru_cache
+
+from greenlet import getcurrent
+from sqlalchemy import event
+
+from app.config import settings
+from app.logger import log
+
+
+# Журнал медленных запросов и детектор N+1. Каждый SQL приводится к отпечатку без литералов
+# и параметров; если за один HTTP-запрос один и тот же отпечаток выполняется больше
+# N_PLUS_ONE_THRESHOLD раз, это почти всегда цикл с запросом внутри (N+1).
+# Порог медленного запроса проверяется всегда, а отпечатки считаются только в доле запросов
+# QUERY_DIAGNOSTICS_SAMPLE_RATE. В строгом режиме (тесты) считается каждый запрос,
+# а N+1 - исключение NPlusOneError. Намеренные циклы порций помечаются batched()
+
+
+class NPlusOneError(Exception):
+    pass
+
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w$])-?\d+(?:\.\d+)?\b")
+_PARAM = re.compile(r"\$\d+|%\(\w+\)s|(?<![:\w]):\w+|\?")
+_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_ROWS = re.compile(r"(\(\?(?:, \?)*\))(?:, \1)+")
+_SPACES = re.compile(r"\s+")
+
+# Файлы, которые не считаются местом вызова: сами хуки и общая обвязка сессий
+_SKIP_FILES = ("diagnostics.py", "metrics.py", "session.py")
+
+
+@lru_cache(maxsize=4096)
+def fingerprint(statement: str) -> str:
+    # SELECT ... WHERE id IN ($1, $2, $3) AND name = 'x' -> SELECT ... WHERE id IN (...) AND name = ?
+    normalized = _SPACES.sub(" ", statement).strip()
+    normalized = _STRING.sub("?", normalized)
+    normalized = _PARAM.sub("?", normalized)
+    normalized = _NUMBER.sub("?", normalized)
+    normalized = _ROWS.sub(r"\1, ...", normalized)
+    return _LIST.sub("(...)", normalized)
+
+
+def call_site(depth: int = 3) -> str:
+    # Код приложения ждёт результата в родительском greenlet, поэтому ищем кадры app/
+    # в его стеке, а не в стеке greenlet, где выполняются события SQLAlchemy.
+    # Несколько кадров: общий метод BaseDAO сам по себе не показывает, откуда цикл
+    parent = getcurrent().parent
+    frame = parent.gr_frame if parent is not None else sys._getframe(1)
+    sites = []
+    while frame is not None and len(sites) < depth:
+        filename = frame.f_code.co_filename
+        if "/app/" in filename and not filename.endswith(_SKIP_FILES):
+            sites.append(f"{filename[filename.rindex('/app/') + 1:]}:{frame.f_lineno} {frame.f_code.co_name}")
+        frame = frame.f_back
+    return " <- ".join(sites) or "unknown"
+
+
+@dataclass
+class TrackedQueries:
+    scope: dict | None = None
+    label: str | None = None
+    sampled: bool = True
+    strict: bool = False
+    counts: Counter = field(default_factory=Counter)
+
+    @property
+    def route(self) -> str:
+        if self.label:
+            return self.label
+        route = self.scope.get("route")
+        path = getattr(route, "path", None) or self.scope.get("path")
+        return f"{self.scope.get('method')} {path}"
+
+
+_tracked: ContextVar[TrackedQueries | None] = ContextVar("tracked_queries", default=None)
+_batched: ContextVar[bool] = ContextVar("batched_queries", default=False)
+
+
+@contextmanager
+def track_queries(label: str = "manual", strict: bool | None = None):
+    # Для тестов и скриптов: отслеживать N+1 в блоке кода вне HTTP-запроса
+    strict = settings.QUERY_DIAGNOSTICS_STRICT if strict is None else strict
+    tracked = TrackedQueries(label=label, strict=strict)
+    token = _tracked.set(tracked)
+    try:
+        yield tracked
+    finally:
+        _tracked.reset(token)
+
+
+@contextmanager
+def batched():
+    # Блок, который намеренно повторяет один запрос порциями (массовое удаление и загрузка,
+    # прогресс фоновой задачи): такие запросы не считаются N+1, медленные по-прежнему пишутся
+    token = _batched.set(True)
+    try:
+        yield
+    finally:
+        _batched.reset(token)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("diagnostics_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed_ms = (time.perf_counter() - conn.info["diagnostics_started"].pop()) * 1000
+    tracked = _tracked.get()
+
+    if settings.SLOW_QUERY_MS is not None and elapsed_ms >= settings.SLOW_QUERY_MS:
+        route = tracked.route if tracked is not None else "-"
+        log.warning(f"Медленный запрос {elapsed_ms:.1f} мс, {route}, {call_site()}: {fingerprint(statement)}")
+
+    if tracked is None or not tracked.sampled or _batched.get():
+        return
+    key = fingerprint(statement)
+    tracked.counts[key] += 1
+    # Сообщаем один раз на отпечаток, в момент превышения порога
+    if tracked.counts[key] == settings.N_PLUS_ONE_THRESHOLD + 1:
+        message = (f"Возможный N+1: больше {settings.N_PLUS_ONE_THRESHOLD} одинаковых запросов, "
+                   f"{tracked.route}, {call_site()}: {key}")
+        if tracked.strict:
+            raise NPlusOneError(message)
+        log.warning(message)
+
+
+def _handle_error(context):
+    if context.connection is not None and context.connection.info.get("diagnostics_started"):
+        context.connection.info["diagnostics_started"].pop()
+
+
+def watch_engine(engine) -> None:
+    sync_engine = engine.sync_engine
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(sync_engine, "handle_error", _handle_error)
+
+
+class DiagnosticsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        strict = settings.QUERY_DIAGNOSTICS_STRICT
+        sampled = strict or random.random() < settings.QUERY_DIAGNOSTICS_SAMPLE_RATE
+        token = _tracked.set(TrackedQueries(scope=scope, sampled=sampled, strict=strict))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _tracked.reset(token)
@@ -0,0 +1,89 @@
+from datetime import datetime
+
+from sqlalchemy import select
+from sqlalchemy import update as sqlalchemy_update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.dao.base import BaseDAO
+from app.dao.session import session_scope
+from app.database import utcnow
+from app.jobs.models import Job, JobStatus
+
+
+class JobDAO(BaseDAO):
+    model = Job
+
+    # Каждый метод - отдельная короткая транзакция: статус задачи виден сразу,
+    # а не после завершения самой задачи
+
+    @classmethod
+    async def claim(cls, job_id: str, session: AsyncSession | None = None) -> Job | None:
+        # Задачу из очереди берёт ровно один процесс: остальные получат None
+        async with session_scope(session) as session:
+            result = await session.execute(
+                sqlalchemy_update(cls.model)
+                .where(cls.model.id == job_id, cls.model.status == JobStatus.queued.value)
+                .values(status=JobStatus.running.value, started_at=utcnow())
+                .returning(cls.model)
+            )
+            return result.scalars().one_or_none()
+
+    @classmethod
+    async def set_progress(cls, job_id: str, progress: dict, session: AsyncSession | None = None) -> None:
+        async with session_scope(session) as session:
+            await session.execute(
+                sqlalchemy_update(cls.model).where(cls.model.id == job_id).values(progress=progress)
+            )
+
+    @classmethod
+    async def finish(cls, job_id: str, status: JobStatus, result: dict | None = None, error: str | None = None,
+                     session: AsyncSession | None = None) -> None:
+        async with session_scope(session) as session:
+            await session.execute(
+                sqlalchemy_update(cls.model)
+                .where(cls.model.id == job_id)
+                .values(status=status.value, result=result, error=error, finished_at=utcnow())
+            )
+
+    @classmethod
+    async def requeue(cls, job_id: str, session: AsyncSession | None = None) -> None:
+        async with session_scope(session) as session:
+            await session.execute(
+                sqlalchemy_update(cls.model)
+                .where(cls.model.id == job_id, cls.model.status == JobStatus.running.value)
+                .values(status=JobStatus.queued.value, started_at=None)
+            )
+
+    @classmethod
+    async def heartbeat(cls, job_ids: list[str], session: AsyncSession | None = None) -> None:
+        # updated_at выполняющихся задач - признак того, что процесс с ними жив
+        if not job_ids:
+            return
+        async with session_scope(session) as session:
+            await session.execute(
+                sqlalchemy_update(cls.model).where(cls.model.id.in_(job_ids)).values(updated_at=utcnow())
+            )
+
+    @classmethod
+    async def fail_stale(cls, before: datetime, session: AsyncSession | None = None) -> int:
+        # Процесс, выполнявший задачу, завершился аварийно: её результат неизвестен
+        async with session_scope(session) as session:
+            result = await session.execute(
+                sqlalchemy_update(cls.model)
+                .where(cls.model.status == JobStatus.running.value, cls.model.updated_at < before)
+                .values(status=JobStatus.failed.value, error="Задача прервана: процесс перестал отвечать",
+                        finished_at=utcnow())
+                .returning(cls.model.id)
+            )
+            return len(result.all())
+
+    @classmethod
+    async def queued(cls, limit: int = 100, session: AsyncSession | None = None) -> list[tuple[str, str]]:
+        async with session_scope(session) as session:
+            result = await session.execute(
+                select(cls.model.id, cls.model.type)
+                .where(cls.model.status == JobStatus.queued.value)
+                .order_by(cls.model.created_at)
+                .limit(limit)
+            )
+            return [tuple(row) for row in result.all()]
@@ -0,0 +1,42 @@
+from datetime import datetime
+from enum import Enum
+
+from sqlalchemy import JSON, Index, String
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.database import Base
+
+
+JSON_TYPE = JSON().with_variant(JSONB(), "postgresql")
+
+
+class JobStatus(str, Enum):
+    queued = "queued"
+    running = "running"
+    succeeded = "succeeded"
+    failed = "failed"
+
+
+class Job(Base):
+    # Фоновая задача app.jobs.runner. Параметры, прогресс и результат хранятся в БД,
+    # поэтому статус доступен после перезапуска, а поставленные задачи не теряются
+    id: Mapped[str] = mapped_column(String(32), primary_key=True)
+    type: Mapped[str] = mapped_column(String(64))
+    status: Mapped[str] = mapped_column(String(16), default=JobStatus.queued.value)
+    params: Mapped[dict] = mapped_column(JSON_TYPE, default=dict)
+    progress: Mapped[dict | None] = mapped_column(JSON_TYPE)
+    result: Mapped[dict | None] = mapped_column(JSON_TYPE)
+    error: Mapped[str | None]
+    started_at: Mapped[datetime | None]
+    finished_at: Mapped[datetime | None]
+
+    __table_args__ = (
+        Index("ix_jobs_status_created_at", "status", "created_at"),
+    )
+
+    def __str__(self):
+        return f"{self.__class__.__name__}(id={self.id!r}, type={self.type!r}, status={self.status!r})"
+
+    def __repr__(self):
+        return str(self)
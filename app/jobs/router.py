@@ -0,0 +1,29 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import JSONResponse
+
+from app.dao.session import PrimaryReadSessionDep
+from app.jobs.dao import JobDAO
+from app.jobs.models import Job
+from app.jobs.schemas import SJob
+
+
+router = APIRouter(prefix='/jobs', tags=['Фоновые задачи'])
+
+
+def accepted_response(job: Job) -> JSONResponse:
+    # 202 Accepted: задача поставлена в очередь, статус - по ссылке из Location
+    status_url = router.url_path_for("get_job", job_id=job.id)
+    return JSONResponse(
+        status_code=202,
+        content={"job_id": job.id, "status": job.status, "status_url": status_url},
+        headers={"Location": status_url},
+    )
+
+
+@router.get("/{job_id}", summary="Получить статус, прогресс и результат фоновой задачи")
+async def get_job(job_id: str, session: PrimaryReadSessionDep) -> SJob:
+    # Статус читается с primary: реплика может ещё не знать о только что поставленной задаче
+    job = await JobDAO.find_one_or_none(session=session, id=job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Задача {job_id} не найдена")
+    return job
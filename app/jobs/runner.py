@@ -0,0 +1,135 @@
+import asyncio
+import contextvars
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Awaitable, Callable
+from uuid import uuid4
+
+from app.config import settings
+from app.database import utcnow
+from app.diagnostics import batched
+from app.jobs.dao import JobDAO
+from app.jobs.models import Job, JobStatus
+from app.logger import log
+
+
+# Фоновые задачи в процессе приложения. Задача сначала ждёт слот своего типа (concurrency),
+# затем слот общего пула (JOB_WORKERS), поэтому задачи одного типа, упёршиеся в свой лимит,
+# не занимают пул. Статус, прогресс и результат пишутся в таблицу jobs; раз в
+# JOB_HEARTBEAT_INTERVAL секунд обслуживающая задача отмечает выполняющиеся задачи живыми,
+# помечает упавшими задачи, которые процесс перестал отмечать, и подхватывает задачи из
+# очереди, в том числе поставленные до перезапуска или другим процессом
+
+
+@dataclass
+class JobType:
+    handler: Callable[..., Awaitable[dict | None]]
+    concurrency: int
+
+
+JOB_TYPES: dict[str, JobType] = {}
+
+
+def job_type(name: str, concurrency: int = 1):
+    # Обработчик: async def handler(job: JobContext, **params) -> dict | None
+    def decorator(func):
+        JOB_TYPES[name] = JobType(func, concurrency)
+        return func
+
+    return decorator
+
+
+class JobContext:
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+
+    async def progress(self, **values) -> None:
+        # Прогресс пишется после каждой порции работы, это не N+1
+        with batched():
+            await JobDAO.set_progress(self.job_id, values)
+
+
+class JobRunner:
+    def __init__(self, workers: int, heartbeat_interval: float, stale_after: float):
+        self.workers = workers
+        self.heartbeat_interval = heartbeat_interval
+        self.stale_after = stale_after
+        self._pool: asyncio.Semaphore | None = None
+        self._type_limits: dict[str, asyncio.Semaphore] = {}
+        self._tasks: dict[str, asyncio.Task] = {}
+        self._running: set[str] = set()
+        self._maintenance: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        self._pool = asyncio.Semaphore(self.workers)
+        self._type_limits = {name: asyncio.Semaphore(t.concurrency) for name, t in JOB_TYPES.items()}
+        self._maintenance = asyncio.create_task(self._maintain())
+
+    async def stop(self) -> None:
+        # Прерванные задачи возвращаются в очередь и выполнятся после перезапуска
+        tasks = list(self._tasks.values())
+        if self._maintenance is not None:
+            tasks.append(self._maintenance)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._maintenance = None
+
+    async def submit(self, type_name: str, **params) -> Job:
+        if type_name not in JOB_TYPES:
+            raise ValueError(f"Неизвестный тип задачи {type_name!r}")
+        if self._pool is None:
+            raise RuntimeError("Обработчик фоновых задач не запущен")
+        job = await JobDAO.add(id=uuid4().hex, type=type_name, status=JobStatus.queued.value, params=params)
+        self._schedule(job.id, type_name)
+        return job
+
+    def _schedule(self, job_id: str, type_name: str) -> None:
+        if job_id in self._tasks:
+            return
+        # Пустой контекст: задача переживает запрос, который её поставил, и не должна писать
+        # свои запросы в его метрики, диагностику и request_id логов
+        task = asyncio.create_task(self._run(job_id, type_name), context=contextvars.Context())
+        self._tasks[job_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job_id, None))
+
+    async def _run(self, job_id: str, type_name: str) -> None:
+        async with self._type_limits[type_name], self._pool:
+            job = await JobDAO.claim(job_id)
+            if job is None:
+                # Задачу уже взял другой процесс
+                return
+            self._running.add(job_id)
+            try:
+                result = await JOB_TYPES[type_name].handler(JobContext(job_id), **job.params)
+            except asyncio.CancelledError:
+                await JobDAO.requeue(job_id)
+                raise
+            except Exception as e:
+                log.error(f"Задача {type_name} {job_id} завершилась ошибкой: {e}", exc_info=True)
+                await JobDAO.finish(job_id, JobStatus.failed, error=str(e))
+            else:
+                await JobDAO.finish(job_id, JobStatus.succeeded, result=result)
+            finally:
+                self._running.discard(job_id)
+
+    async def _maintain(self) -> None:
+        while True:
+            try:
+                await JobDAO.heartbeat(list(self._running))
+                failed = await JobDAO.fail_stale(before=utcnow() - timedelta(seconds=self.stale_after))
+                if failed:
+                    log.warning(f"Помечено упавшими зависших задач: {failed}")
+                for job_id, type_name in await JobDAO.queued():
+                    if type_name in JOB_TYPES:
+                        self._schedule(job_id, type_name)
+            except Exception as e:
+                log.error(f"Ошибка обслуживания фоновых задач: {e}")
+            await asyncio.sleep(self.heartbeat_interval)
+
+
+job_runner = JobRunner(
+    workers=settings.JOB_WORKERS,
+    heartbeat_interval=settings.JOB_HEARTBEAT_INTERVAL,
+    stale_after=settings.JOB_STALE_AFTER,
+)
@@ -0,0 +1,26 @@
+from datetime import datetime
+
+from pydantic import BaseModel, ConfigDict, Field
+
+from app.jobs.models import JobStatus
+
+
+class SJob(BaseModel):
+    id: str
+    type: str
+    status: JobStatus
+    params: dict
+    progress: dict | None = Field(None, description="Промежуточное состояние, которое сообщает задача")
+    result: dict | None = None
+    error: str | None = None
+    created_at: datetime
+    started_at: datetime | None = None
+    finished_at: datetime | None = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+
+class SJobAccepted(BaseModel):
+    job_id: str
+    status: JobStatus
+    status_url: str = Field(description="Адрес для опроса статуса задачи")
@@ -1,9 +1,143 @@
+import atexit
 import logging
+import queue
 import sys
+import time
+import traceback
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from uuid import uuid4
+
+import orjson
+
+from app.config import settings
+
+
+# Обработчики запроса только кладут запись в очередь, а в stdout её пишет фоновый поток
+# QueueListener: медленный stdout больше не блокирует цикл событий. Если очередь
+# переполнена, запись отбрасывается и учитывается в dropped_records
+
+REQUEST_ID_HEADER = "X-Request-ID"
+LOG_QUEUE_SIZE = 10_000
+
+_request_id: ContextVar[str | None] = ContextVar("request_id", default=None)
+_request_scope: ContextVar[dict | None] = ContextVar("request_scope", default=None)
+
+dropped_records = 0
+
+
+def current_request_scope() -> dict | None:
+    # ASGI scope текущего HTTP-запроса; None вне запроса (фоновые задачи, скрипты)
+    return _request_scope.get()
+
+
+class RequestContextFilter(logging.Filter):
+    # Выполняется в потоке, который пишет в лог, поэтому видит contextvars запроса
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = _request_id.get()
+        scope = _request_scope.get()
+        route = scope.get("route") if scope is not None else None
+        record.route = getattr(route, "path", None) or (scope.get("path") if scope is not None else None)
+        return True
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # В отличие от QueueHandler.prepare, traceback сохраняется отдельно от сообщения,
+        # чтобы JSON-форматтер положил его в своё поле
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = "".join(traceback.format_exception(*record.exc_info))
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        global dropped_records
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            dropped_records += 1
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S") + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "request_id": getattr(record, "request_id", None),
+            "route": getattr(record, "route", None),
+        }
+        if record.exc_text:
+            data["exc"] = record.exc_text
+        return orjson.dumps(data).decode()
+
+
+class TracebackLimiter:
+    # Ожидаемые 4xx: traceback не чаще раза в interval секунд на ключ (класс ошибки и маршрут)
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._last: dict[tuple, float] = {}
+
+    def allow(self, key: tuple) -> bool:
+        now = time.monotonic()
+        if now - self._last.get(key, float("-inf")) < self.interval:
+            return False
+        self._last[key] = now
+        return True
+
+
+traceback_limiter = TracebackLimiter(settings.LOG_4XX_TRACEBACK_INTERVAL)
+
+
+class RequestContextMiddleware:
+    # Id запроса берётся из заголовка X-Request-ID или создаётся и возвращается в ответе
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")[:128]
+                break
+        request_id = request_id or uuid4().hex
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = [*message.get("headers", []), (b"x-request-id", request_id.encode("latin-1"))]
+                message = {**message, "headers": headers}
+            await send(message)
+
+        id_token = _request_id.set(request_id)
+        scope_token = _request_scope.set(scope)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_scope.reset(scope_token)
+            _request_id.reset(id_token)
+
 
 log = logging.getLogger()
-log.setLevel(logging.DEBUG)
+log.setLevel(settings.LOG_LEVEL)
+
+_stream_handler = logging.StreamHandler(sys.stdout)
+if settings.LOG_JSON:
+    _stream_handler.setFormatter(JsonFormatter())
+else:
+    _stream_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s [%(request_id)s %(route)s] %(message)s"))
+
+handler = NonBlockingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+handler.addFilter(RequestContextFilter())
+log.addHandler(handler)
 
-handler = logging.StreamHandler(sys.stdout)
-handler.setLevel(logging.DEBUG)
-log.addHandler(handler)
\ No newline at end of file
+listener = QueueListener(handler.queue, _stream_handler, respect_handler_level=True)
+listener.start()
+# При выходе дописываем всё, что осталось в очереди
+atexit.register(listener.stop)
@@ -1,22 +1,65 @@
-from fastapi import FastAPI, Request
-from fastapi.responses import JSONResponse
+import asyncio
+from contextlib import asynccontextmanager
 
-from app.logger import log
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse, ORJSONResponse
+
+from app.cache import cache_stats, init_cache
+from app.config import settings
+from app.counters.dao import fold_periodically
+from app.dao.session import ReadPrimaryMiddleware
+from app.database import engine, replica_engines
+from app.diagnostics import DiagnosticsMiddleware
+from app.logger import RequestContextMiddleware, log, traceback_limiter
 from app.exceptions import BaseAppError
+from app.jobs.router import router as router_jobs
+from app.jobs.runner import job_runner
 from app.majors.router import router as router_majors
+from app.metrics import MetricsMiddleware, render_metrics
+from app.stats.router import router as router_stats
 from app.students.router import router as router_students
 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    init_cache()
+    fold_task = asyncio.create_task(fold_periodically(settings.COUNTER_FOLD_INTERVAL))
+    await job_runner.start()
+    yield
+    await job_runner.stop()
+    fold_task.cancel()
+
+
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
+app.add_middleware(ReadPrimaryMiddleware)
+app.add_middleware(DiagnosticsMiddleware)
+app.add_middleware(MetricsMiddleware, server_timing=settings.SERVER_TIMING_ENABLED)
+app.add_middleware(RequestContextMiddleware)
 
 
 @app.exception_handler(BaseAppError)
 async def app_exception_handler(request: Request, exc: BaseAppError):
-    log.error(f"Ошибка {exc.status_code}: {exc.detail}", exc_info=True)
+    status_code = getattr(exc, "status_code", 500)
+    if status_code >= 500:
+        log.error(f"Ошибка {status_code}: {exc.detail}", exc_info=True)
+    else:
+        # 4xx - ожидаемые ошибки клиента: сообщение всегда, traceback - изредка
+        route = getattr(request.scope.get("route"), "path", request.url.path)
+        with_traceback = traceback_limiter.allow((type(exc).__name__, route))
+        log.warning(f"Ошибка {status_code}: {exc.detail}", exc_info=with_traceback)
     return JSONResponse(
-        status_code=getattr(exc, "status_code", 500),
+        status_code=status_code,
         content={"detail": exc.detail}
     )
 
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics() -> Response:
+    pools = {"primary": engine.pool} | {f"replica{i}": e.pool for i, e in enumerate(replica_engines)}
+    return Response(content=render_metrics(pools, cache_stats), media_type="text/plain; version=0.0.4")
+
+
 app.include_router(router_students)
 app.include_router(router_majors)
+app.include_router(router_stats)
+app.include_router(router_jobs)
@@ -1,118 +1,223 @@
 from sqlalchemy import delete as sqlalchemy_delete
-from sqlalchemy import select
-
+from sqlalchemy import func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import raiseload
+
+from app.cache import MAJORS_NAMESPACE
+from app.cache import invalidate_on_commit as invalidate_cache_on_commit
+from app.counters.dao import CounterDAO
+from app.counters.models import EnrollmentDelta
 from app.dao.base import BaseDAO
-from app.database import async_session_maker
+from app.dao.session import session_scope
 from app.enums import MajorEnum, institutes_enum
 from app.majors.institutes.models import Institute
 from app.majors.models import Major
+from app.majors.reference_cache import reference_cache
 
 
 class MajorDAO(BaseDAO):
     model = Major
 
+    # Ответы /majors не используют связи: случайное обращение к ним - ошибка, а не лишний запрос
+    load_profiles = {
+        "list": (raiseload("*"),),
+        "detail": (raiseload("*"),),
+    }
+
+    # count_students в разреженной выборке сразу включает ещё не свёрнутые изменения
+    extra_fields = {
+        "count_students": (
+            func.greatest(
+                Major.count_students + func.coalesce(
+                    select(func.sum(EnrollmentDelta.delta))
+                    .where(EnrollmentDelta.major_id == Major.id)
+                    .scalar_subquery(),
+                    0,
+                ),
+                0,
+            ),
+            None,
+        ),
+    }
+
+    # count_students в ответах включает несвёрнутый журнал: новая запись в нём меняет версию,
+    # а свёртка обновляет counts_updated_at специальностей
+    version_columns = ((Major.counts_updated_at, None),)
+    version_dependencies = (select(func.max(EnrollmentDelta.id)).scalar_subquery(),)
+
     @classmethod
-    async def find_all_majors(cls, **filter_by):
-        async with async_session_maker() as session:
-            stmt = select(cls.model).filter_by(**filter_by).order_by(cls.model.id)
-            result = await session.execute(stmt)
-            return result.scalars().all()
+    def _filter_conditions(cls, **filter_by) -> list:
+        # institute_name из QueryParamsMajor - не колонка majors, ищем через связанные институты
+        institute_name = filter_by.pop("institute_name", None)
+        conditions = super()._filter_conditions(**filter_by)
+        if institute_name is not None:
+            conditions.append(cls.model.institutes.any(Institute.institute_name == institute_name))
+        return conditions
+
+    @classmethod
+    async def find_all_majors(cls, limit: int | None = None, after: str | None = None,
+                              fields: list[str] | None = None,
+                              session: AsyncSession | None = None, **filter_by):
+        async with session_scope(session, read_only=True) as session:
+            rows = await cls.find_all(limit=limit, after=after, fields=fields, session=session, **filter_by)
+            if fields:
+                return rows
+            return await CounterDAO.apply_pending(rows, EnrollmentDelta.major_id, session)
             
 
+    # Любое изменение специальностей сбрасывает кэш справочников и кэш ответов /majors
     @classmethod
-    async def find_one_major(cls, **filter_by):
-        async with async_session_maker() as session:
-            filter_by = {k: v for k, v in filter_by.items() if v is not None}
-            stmt = select(cls.model).filter_by(**filter_by)
-            result = await session.execute(stmt)
-            return result.scalars().one_or_none()
+    async def _invalidate_caches(cls, session: AsyncSession) -> None:
+        reference_cache.invalidate_on_commit(session)
+        await invalidate_cache_on_commit(session, MAJORS_NAMESPACE)
+
+
+    @classmethod
+    async def add(cls, session: AsyncSession | None = None, **values):
+        async with session_scope(session) as session:
+            new_major = await super().add(session=session, **values)
+            await cls._invalidate_caches(session)
+            return new_major
 
 
     @classmethod
-    async def delete_majors_range(cls, start_id: int | None = None, end_id: int | None = None):       
-        async with async_session_maker() as session:
-            async with session.begin():
-                stmt = sqlalchemy_delete(cls.model)
-                if start_id is not None and end_id is not None:
-                    # stmt = stmt.where(cls.model.id >= start_id, cls.model.id <= end_id)
-                    stmt = stmt.where(cls.model.id.between(start_id, end_id))
-                elif start_id is not None:
-                    stmt = stmt.where(cls.model.id >= start_id)
+    async def update(cls, filter_by: dict, session: AsyncSession | None = None, **values):
+        async with session_scope(session) as session:
+            updated_major = await super().update(filter_by, session=session, **values)
+            await cls._invalidate_caches(session)
+            if updated_major is not None:
+                await CounterDAO.apply_pending([updated_major], EnrollmentDelta.major_id, session)
+            return updated_major
+
 
-                stmt = stmt.returning(cls.model)
-                result = await session.execute(stmt)
-                return result.scalars().all()
+    @classmethod
+    async def delete(cls, delete_all: bool = False, session: AsyncSession | None = None, **filter_by):
+        async with session_scope(session) as session:
+            deleted = await super().delete(delete_all, session=session, **filter_by)
+            await cls._invalidate_caches(session)
+            return deleted
 
 
     @classmethod
-    async def sync_with_enums(cls) -> dict:
+    async def find_one_major(cls, fields: list[str] | None = None,
+                             session: AsyncSession | None = None, **filter_by):
+        async with session_scope(session, read_only=True) as session:
+            filter_by = {k: v for k, v in filter_by.items() if v is not None}
+            major = await cls.find_one_or_none(fields=fields, session=session, **filter_by)
+            if major is not None and not fields:
+                await CounterDAO.apply_pending([major], EnrollmentDelta.major_id, session)
+            return major
+
+
+    @classmethod
+    async def delete_majors_range(cls, start_id: int | None = None, end_id: int | None = None,
+                                  session: AsyncSession | None = None):
+        async with session_scope(session) as session:
+            stmt = sqlalchemy_delete(cls.model)
+            if start_id is not None and end_id is not None:
+                # stmt = stmt.where(cls.model.id >= start_id, cls.model.id <= end_id)
+                stmt = stmt.where(cls.model.id.between(start_id, end_id))
+            elif start_id is not None:
+                stmt = stmt.where(cls.model.id >= start_id)
+
+            stmt = stmt.returning(cls.model)
+            result = await session.execute(stmt)
+            deleted_majors = result.scalars().all()
+            await cls._invalidate_caches(session)
+            return deleted_majors
+
+
+    @classmethod
+    async def plan_sync_with_enums(cls, session: AsyncSession | None = None) -> dict:
+        # Одним запросом читаем всё дерево специальностей и институтов и сравниваем его с enums
         if set(institutes_enum.keys()) != set(MajorEnum):
             raise ValueError("institutes_enum и MajorEnum не совпадают")
 
-        async with async_session_maker() as session:
-            async with session.begin():
-
-                # Получаем majors из БД
-                result = await session.execute(select(cls.model))
-                db_majors = result.scalars().all()
-                db_major_names = {m.major_name: m for m in db_majors}
-
-                enum_major_names = {e.value for e in MajorEnum}
-
-                to_add_majors = enum_major_names - set(db_major_names.keys())
-                to_delete_majors = set(db_major_names.keys()) - enum_major_names
-
-                # удаляем лишние majors
-                for major_name in to_delete_majors:
-                    major = db_major_names[major_name]
-
-                    await session.execute(
-                        sqlalchemy_delete(Institute).where(Institute.major_id == major.id)
-                    )
-                    await session.delete(major)
-
-                # добавляем недостающие majors и сразу кладём в db_major_names
-                for major_name in to_add_majors:
-                    new_major = cls.model(major_name=major_name)
-                    session.add(new_major)
-                    db_major_names[major_name] = new_major
-
-                # flush чтобы новые majors получили id до работы с institutes
-                await session.flush()
-
-                # Синхронизируем institutes
-                to_add_institutes: list[str] = []
-                to_delete_institutes: list[str] = []
-
-                for major_enum in MajorEnum:
-                    major_name = major_enum.value
-                    major = db_major_names[major_name]
-
-                    result_inst = await session.execute(
-                        select(Institute).where(Institute.major_id == major.id)
-                    )
-                    db_institutes = result_inst.scalars().all()
-                    db_institute_names = {i.institute_name for i in db_institutes}
-
-                    enum_institutes = set(institutes_enum.get(major_enum, []))
-
-                    for inst in db_institutes:
-                        if inst.institute_name not in enum_institutes:
-                            await session.delete(inst)
-                            to_delete_institutes.append(inst.institute_name)
-
-                    for name in enum_institutes - db_institute_names:
-                        session.add(Institute(institute_name=name, major_id=major.id))
-                        to_add_institutes.append(name)
-
-                return {
-                    "majors": {
-                        "added": list(to_add_majors),
-                        "deleted": list(to_delete_majors),
-                    },
-                    "institutes": {
-                        "added": to_add_institutes,
-                        "deleted": to_delete_institutes,
-                    },
-                    "synced": not any([to_add_majors, to_delete_majors, to_add_institutes, to_delete_institutes]),
-                }
\ No newline at end of file
+        async with session_scope(session, read_only=True) as session:
+            result = await session.execute(
+                select(cls.model.id, cls.model.major_name, Institute.id, Institute.institute_name)
+                .outerjoin(Institute, Institute.major_id == cls.model.id)
+            )
+            rows = result.all()
+
+        db_major_ids: dict[str, int] = {}
+        db_institutes: dict[str, dict[str, int]] = {}
+        for major_id, major_name, institute_id, institute_name in rows:
+            db_major_ids[major_name] = major_id
+            institutes = db_institutes.setdefault(major_name, {})
+            if institute_id is not None:
+                institutes[institute_name] = institute_id
+
+        enum_institutes = {major.value: set(names) for major, names in institutes_enum.items()}
+
+        to_add_majors = sorted(enum_institutes.keys() - db_major_ids.keys())
+        to_delete_majors = sorted(db_major_ids.keys() - enum_institutes.keys())
+
+        # Институты удалённых специальностей и институты, которых больше нет в enums у своей специальности
+        to_delete_institutes: dict[str, int] = {}
+        to_add_institutes: list[tuple[str, str]] = []
+        for major_name, institutes in db_institutes.items():
+            expected = enum_institutes.get(major_name, set())
+            for institute_name, institute_id in institutes.items():
+                if institute_name not in expected:
+                    to_delete_institutes[institute_name] = institute_id
+        for major_name, expected in enum_institutes.items():
+            existing = db_institutes.get(major_name, {})
+            for institute_name in sorted(expected - existing.keys()):
+                to_add_institutes.append((institute_name, major_name))
+
+        return {
+            "majors": {
+                "added": to_add_majors,
+                "deleted": to_delete_majors,
+            },
+            "institutes": {
+                "added": [institute_name for institute_name, _ in to_add_institutes],
+                "deleted": sorted(to_delete_institutes),
+            },
+            "synced": not any([to_add_majors, to_delete_majors, to_add_institutes, to_delete_institutes]),
+            # Данные для применения плана, наружу не отдаются
+            "_major_ids": {name: db_major_ids[name] for name in db_major_ids},
+            "_delete_major_ids": [db_major_ids[name] for name in to_delete_majors],
+            "_delete_institute_ids": list(to_delete_institutes.values()),
+            "_add_institutes": to_add_institutes,
+        }
+
+
+    @classmethod
+    async def sync_with_enums(cls, session: AsyncSession | None = None) -> dict:
+        async with session_scope(session) as session:
+            plan = await cls.plan_sync_with_enums(session=session)
+            if plan["synced"]:
+                return plan
+
+            # Сначала удаляем: имя института уникально, и институт, перенесённый
+            # в другую специальность, нужно удалить до вставки
+            if plan["_delete_institute_ids"]:
+                await session.execute(
+                    sqlalchemy_delete(Institute).where(Institute.id.in_(plan["_delete_institute_ids"]))
+                )
+            if plan["_delete_major_ids"]:
+                await session.execute(
+                    sqlalchemy_delete(cls.model).where(cls.model.id.in_(plan["_delete_major_ids"]))
+                )
+
+            major_ids = plan["_major_ids"]
+            if plan["majors"]["added"]:
+                result = await session.execute(
+                    insert(cls.model)
+                    .values([{"major_name": name} for name in plan["majors"]["added"]])
+                    .returning(cls.model.major_name, cls.model.id)
+                )
+                major_ids.update(result.all())
+
+            if plan["_add_institutes"]:
+                await session.execute(
+                    insert(Institute).values([
+                        {"institute_name": institute_name, "major_id": major_ids[major_name]}
+                        for institute_name, major_name in plan["_add_institutes"]
+                    ])
+                )
+
+            await cls._invalidate_caches(session)
+            return plan
@@ -6,7 +6,7 @@ from app.database import Base, int_pk, str_uniq
 class Institute(Base):
     id: Mapped[int_pk]
     institute_name: Mapped[str_uniq]
-    major_id: Mapped[int] = mapped_column(ForeignKey("majors.id"), nullable=False)
+    major_id: Mapped[int] = mapped_column(ForeignKey("majors.id"), nullable=False, index=True)
     count_students: Mapped[int] = mapped_column(server_default=text('0'))
 
     major: Mapped["Major"] = relationship("Major", back_populates="institutes")
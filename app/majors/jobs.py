@@ -0,0 +1,19 @@
+from app.jobs.runner import JobContext, job_type
+from app.majors.dao import MajorDAO
+
+
+# Длинные операции со специальностями для app.jobs. Параллельно выполняется не больше одной
+# задачи каждого типа: обе меняют справочник целиком или диапазонами
+
+
+@job_type("majors.sync_enums", concurrency=1)
+async def sync_enums_job(job: JobContext) -> dict:
+    plan = await MajorDAO.sync_with_enums()
+    # Ключи с "_" - внутренние данные плана (id), в результат задачи они не попадают
+    return {key: value for key, value in plan.items() if not key.startswith("_")}
+
+
+@job_type("majors.delete_range", concurrency=1)
+async def delete_range_job(job: JobContext, start_id: int | None = None, end_id: int | None = None) -> dict:
+    deleted = await MajorDAO.delete_majors_range(start_id, end_id)
+    return {"deleted": len(deleted), "deleted_ids": [major.id for major in deleted]}
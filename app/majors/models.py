@@ -1,12 +1,17 @@
+from datetime import datetime
+
 from sqlalchemy import text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from app.database import Base, int_pk, str_uniq
+from app.database import Base, int_pk, str_uniq, utc_now
 
 
 class Major(Base):
     id: Mapped[int_pk]
     major_name: Mapped[str_uniq]
     count_students: Mapped[int] = mapped_column(server_default=text('0'))
+    # Время последней свёртки счётчика. updated_at свёртка не трогает: от него зависят
+    # версии ответов о студентах этой специальности, а количество в них не входит
+    counts_updated_at: Mapped[datetime] = mapped_column(server_default=utc_now())
 
     institutes: Mapped[list["Institute"]] = relationship("Institute", back_populates="major")
     students: Mapped[list["Student"]] = relationship("Student", back_populates="major")
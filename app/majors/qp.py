@@ -1,4 +1,9 @@
+from typing import Annotated
 
+from fastapi import Query
+
+
+MajorFieldsQuery = Annotated[str | None, Query(description="Поля ответа через запятую, например id,count_students")]
 
 
 class QueryParamsMajor:
@@ -0,0 +1,82 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.database import async_session_maker
+from app.majors.institutes.models import Institute
+from app.majors.models import Major
+
+
+@dataclass(frozen=True)
+class ReferenceData:
+    major_ids: dict[str, int] = field(default_factory=dict)
+    institute_ids: dict[str, int] = field(default_factory=dict)
+    # id специальности -> названия её институтов: институт студента должен относиться к его специальности
+    institutes_by_major: dict[int, set[str]] = field(default_factory=dict)
+
+
+# Справочники специальностей и институтов в памяти процесса.
+# Данные перечитываются по истечении ttl или после invalidate(): каждая
+# инвалидация увеличивает версию, и загрузка, начатая до неё, не сохраняется
+class ReferenceCache:
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.version = 0
+        self._data: ReferenceData | None = None
+        self._loaded_at = 0.0
+        self._loaded_version = -1
+        self._lock = asyncio.Lock()
+
+    def _is_fresh(self) -> bool:
+        return (
+            self._data is not None
+            and self._loaded_version == self.version
+            and time.monotonic() - self._loaded_at < self.ttl
+        )
+
+    async def get(self, force: bool = False) -> ReferenceData:
+        if not force and self._is_fresh():
+            return self._data
+        async with self._lock:
+            # Пока ждали блокировку, данные мог загрузить другой запрос
+            if not force and self._is_fresh():
+                return self._data
+            version = self.version
+            data = await self._load()
+            if version == self.version:
+                self._data = data
+                self._loaded_at = time.monotonic()
+                self._loaded_version = version
+            return data
+
+    def invalidate(self) -> None:
+        self.version += 1
+
+    def invalidate_on_commit(self, session: AsyncSession) -> None:
+        # Сбрасываем сразу и ещё раз после commit: пока транзакция не зафиксирована,
+        # параллельные запросы видят старые данные и могут снова загрузить их в кэш
+        self.invalidate()
+        event.listen(session.sync_session, "after_commit", lambda _: self.invalidate(), once=True)
+
+    @staticmethod
+    async def _load() -> ReferenceData:
+        async with async_session_maker() as session:
+            result = await session.execute(select(Major.major_name, Major.id))
+            major_ids = dict(result.all())
+            result = await session.execute(
+                select(Institute.institute_name, Institute.id, Institute.major_id)
+            )
+            institute_ids: dict[str, int] = {}
+            institutes_by_major: dict[int, set[str]] = {}
+            for institute_name, institute_id, major_id in result.all():
+                institute_ids[institute_name] = institute_id
+                institutes_by_major.setdefault(major_id, set()).add(institute_name)
+        return ReferenceData(major_ids, institute_ids, institutes_by_major)
+
+
+reference_cache = ReferenceCache(ttl=settings.REFERENCE_CACHE_TTL)
@@ -1,32 +1,73 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+
+import app.majors.jobs  # noqa: F401 - регистрирует типы фоновых задач специальностей
+from app.cache import MAJORS_NAMESPACE, cache_response
+from app.conditional import conditional_get
+from app.dao.pagination import next_cursor, page_size
+from app.dao.session import ReadSessionDep, SessionDep
+from app.jobs.router import accepted_response
+from app.jobs.runner import job_runner
 from app.majors.dao import MajorDAO
-from app.majors.qp import QueryParamsMajor
-from app.majors.schemas import SMajorAdd, SMajorResponse, SMajorResponseList, SMajorsRead, SMajorsUpdate
+from app.majors.qp import MajorFieldsQuery, QueryParamsMajor
+from app.majors.schemas import (SMajorAdd, SMajorResponse, SMajorResponseList, SMajorsPage, SMajorsRead,
+                                SMajorsUpdate, majors_list_adapter)
+from app.serialization import list_response, page_response
+from app.students.qp import AfterQuery, BackgroundQuery, LimitQuery
 
 
 router = APIRouter(prefix='/majors', tags=['Работа со специальностями (профилями обучения)'])
 
 
+async def majors_page_version(session, limit: int, after: str | None, query_params=None, **_):
+    filters = query_params.to_dict() if query_params is not None else {}
+    return await MajorDAO.page_version(limit=page_size(limit), after=after, session=session, **filters)
+
+
 @router.get("/", summary="Получить все специальности")
-async def get_all_majors() -> list[SMajorsRead]:
-    majors = await MajorDAO.find_all_majors()
-    return majors
+@cache_response(MAJORS_NAMESPACE)
+@conditional_get(majors_page_version, use_last_modified=False)
+async def get_all_majors(
+    request: Request,
+    session: ReadSessionDep,
+    limit: LimitQuery = None,
+    after: AfterQuery = None,
+    fields: MajorFieldsQuery = None,
+) -> SMajorsPage | list[SMajorsRead]:
+    majors = await MajorDAO.find_all_majors(limit=page_size(limit), after=after,
+                                            fields=MajorDAO.parse_fields(fields), session=session)
+    cursor = next_cursor(majors, page_size(limit))
+    if limit is None:
+        return list_response(majors_list_adapter, majors, cursor, request)
+    return page_response(majors_list_adapter, majors, cursor)
 
 
 @router.get("", summary="Получить специальность по фильтру (фильтрам) или все")
-async def get_major_by_filters(query_params: QueryParamsMajor = Depends()) -> SMajorResponseList | list[SMajorsRead]:
+@cache_response(MAJORS_NAMESPACE)
+@conditional_get(majors_page_version, use_last_modified=False)
+async def get_major_by_filters(
+    request: Request,
+    session: ReadSessionDep,
+    query_params: QueryParamsMajor = Depends(),
+    limit: LimitQuery = None,
+    after: AfterQuery = None,
+    fields: MajorFieldsQuery = None,
+) -> SMajorResponseList | list[SMajorsRead]:
     filters = query_params.to_dict()
-    majors = await MajorDAO.find_all_majors(**filters)
+    majors = await MajorDAO.find_all_majors(limit=page_size(limit), after=after,
+                                            fields=MajorDAO.parse_fields(fields), session=session, **filters)
     if not majors:
         raise HTTPException(status_code=404, detail="Специальности с указанными фильтрами не найден")
-    if not filters:
-        return {"message": "Специальности не указаны, поэтому выдаются все специальности!", "majors": majors}
-    return majors
+    cursor = next_cursor(majors, page_size(limit))
+    if limit is None and filters:
+        return list_response(majors_list_adapter, majors, cursor, request)
+    message = None if filters else "Специальности не указаны, поэтому выдаются все специальности!"
+    return page_response(majors_list_adapter, majors, cursor, items_key="majors", message=message)
 
 
 @router.post("", summary="Добавить новую специальность")
-async def register_major(major: SMajorAdd) -> SMajorResponse:
-    new_major = await MajorDAO.add(**major.model_dump())
+async def register_major(major: SMajorAdd, session: SessionDep) -> SMajorResponse:
+    # institute_name только проверяется схемой, колонки в majors для него нет
+    new_major = await MajorDAO.add(session=session, **major.model_dump(exclude={"institute_name"}))
     if not new_major:
         raise HTTPException(status_code=400, detail="Ошибка при добавлении")
     return {
@@ -36,16 +77,15 @@ async def register_major(major: SMajorAdd) -> SMajorResponse:
 
 
 @router.put("/{major_id}", summary="Обновить специальность")
-async def update_major_by_id(major_id: int, major: SMajorsUpdate) -> SMajorResponse:
+async def update_major_by_id(major_id: int, major: SMajorsUpdate, session: SessionDep) -> SMajorResponse:
     # update_data = {k: v for k, v in major.model_dump().items() if k != "id"}
     update_data = major.model_dump(exclude={"id"})
-    print(f"{update_data=}")
     if not update_data:
         raise HTTPException(status_code=400, detail="Не переданы данные для обновления")
-    updated_major = await MajorDAO.update(filter_by={"id": major_id}, **update_data)
+    updated_major = await MajorDAO.update(filter_by={"id": major_id}, session=session, **update_data)
 
     if not updated_major:
-        new_major = await MajorDAO.add(id=major.id, **update_data)
+        new_major = await MajorDAO.add(session=session, id=major_id, **update_data)
         if not new_major:
             raise HTTPException(status_code=400, detail="Ошибка при создании специальности")
         return {
@@ -60,11 +100,11 @@ async def update_major_by_id(major_id: int, major: SMajorsUpdate) -> SMajorRespo
 
 
 @router.patch("/{major_id}", summary="Обновить специальность")
-async def update_major_by_id(major_id: int, major: SMajorsUpdate) -> SMajorResponse:
+async def update_major_by_id(major_id: int, major: SMajorsUpdate, session: SessionDep) -> SMajorResponse:
     update_data = {k: v for k, v in major.model_dump().items() if v is not None}
     if not update_data:
         raise HTTPException(status_code=400, detail="Не переданы данные для обновления")
-    updated_major = await MajorDAO.update(filter_by={"id": major_id}, **update_data)
+    updated_major = await MajorDAO.update(filter_by={"id": major_id}, session=session, **update_data)
     if not updated_major:
         raise HTTPException(status_code=404, detail="Специальность с таким ID не найдена")
     return {
@@ -74,8 +114,8 @@ async def update_major_by_id(major_id: int, major: SMajorsUpdate) -> SMajorRespo
 
 
 @router.delete("/{major_id}", summary="Удалить специальность по ID")
-async def delete_major(major_id: int) -> dict:
-    deleted_major = await MajorDAO.delete(id=major_id)
+async def delete_major(major_id: int, session: SessionDep) -> dict:
+    deleted_major = await MajorDAO.delete(session=session, id=major_id)
     if deleted_major:
         return {"message": f"Специальность с ID {major_id} удалена!"}
     else:
@@ -84,11 +124,16 @@ async def delete_major(major_id: int) -> dict:
 
 @router.delete("", summary="Удалить специальности по диапазону ID или все")
 async def delete_majors(
+    session: SessionDep,
     start_id: int | None = Query(None, ge=1, description="ID начала диапазона включительно"),
-    end_id: int | None = Query(None, ge=1, description="ID конца диапазона включительно")
+    end_id: int | None = Query(None, ge=1, description="ID конца диапазона включительно"),
+    background: BackgroundQuery = False
 ):
+    if background:
+        job = await job_runner.submit("majors.delete_range", start_id=start_id, end_id=end_id)
+        return accepted_response(job)
     try:
-        deleted_majors = await MajorDAO.delete_majors_range(start_id, end_id)
+        deleted_majors = await MajorDAO.delete_majors_range(start_id, end_id, session=session)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
@@ -104,15 +149,33 @@ async def delete_majors(
 
 
 @router.post("/sync-enums")
-async def sync_majors_and_institutes_with_enums():
+async def sync_majors_and_institutes_with_enums(
+    session: SessionDep,
+    dry_run: bool = Query(False, description="Только показать план изменений, ничего не записывая"),
+    background: BackgroundQuery = False
+):
+    if background and not dry_run:
+        job = await job_runner.submit("majors.sync_enums")
+        return accepted_response(job)
     try:
-        result = await MajorDAO.sync_with_enums()
+        if dry_run:
+            # План строится в отдельной сессии только для чтения, транзакция записи не открывается
+            result = await MajorDAO.plan_sync_with_enums()
+        else:
+            result = await MajorDAO.sync_with_enums(session=session)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
     if result["synced"]:
         return {"message": "Majors и institutes уже синхронизированы с enums."}
 
+    if dry_run:
+        return {
+            "message": "План синхронизации (dry run), изменения не применены.",
+            "majors": result["majors"],
+            "institutes": result["institutes"],
+        }
+
     return {
         "message": "Синхронизация выполнена.",
         "majors": result["majors"],
@@ -1,11 +1,11 @@
-from pydantic import BaseModel, ConfigDict, Field, field_validator
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter, field_validator
 from app.enums import institutes_enum
 
 
 class SMajorsRead(BaseModel):
     id: int
     major_name: str = Field(description="Название специальности")
-    institute_name: str = Field(description="Название института")
+    institute_name: str | None = Field(None, description="Название института")
     count_students: int = Field(0, description="Количество студентов на специальности")
 
     model_config = ConfigDict(from_attributes=True)
@@ -38,3 +38,12 @@ class SMajorResponse(BaseModel):
 class SMajorResponseList(BaseModel):
     message: str | None = None
     majors: list[SMajorsRead]
+    next_cursor: str | None = Field(None, description="Курсор следующей страницы, если она есть")
+
+
+class SMajorsPage(BaseModel):
+    items: list[SMajorsRead]
+    next_cursor: str | None = Field(None, description="Курсор следующей страницы, если она есть")
+
+
+majors_list_adapter = TypeAdapter(list[SMajorsRead])
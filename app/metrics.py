@@ -0,0 +1,204 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from sqlalchemy import event
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+
+# Метрики запроса собираются в объект, который лежит в contextvar на время запроса:
+# события SQLAlchemy выполняются в greenlet с тем же контекстом, поэтому видят его.
+# Гистограммы живут в памяти процесса; при нескольких воркерах каждый отдаёт свои
+
+
+@dataclass
+class RequestStats:
+    started: float = field(default_factory=time.perf_counter)
+    queries: int = 0
+    db_time: float = 0.0
+    pool_wait: float = 0.0
+    serialization: float = 0.0
+
+
+_current: ContextVar[RequestStats | None] = ContextVar("request_stats", default=None)
+
+
+def current_stats() -> RequestStats | None:
+    return _current.get()
+
+
+@contextmanager
+def serialization_timer():
+    stats = _current.get()
+    if stats is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.serialization += time.perf_counter() - started
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    # Время ожидания свободного соединения (включая открытие нового) записывается в метрики запроса
+    def _do_get(self):
+        stats = _current.get()
+        if stats is None:
+            return super()._do_get()
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            stats.pool_wait += time.perf_counter() - started
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_started"].pop()
+    stats = _current.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_time += time.perf_counter() - started
+
+
+def _handle_error(context):
+    # after_cursor_execute при ошибке не вызывается, снимаем время начала сами
+    if context.connection is not None and context.connection.info.get("query_started"):
+        context.connection.info["query_started"].pop()
+
+
+def instrument_engine(engine) -> None:
+    sync_engine = engine.sync_engine
+    event.listen(sync_engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(sync_engine, "handle_error", _handle_error)
+
+
+SECONDS_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERIES_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: tuple):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        # labels -> [счётчики по бакетам..., сумма, количество]
+        self.series: dict[tuple, list] = {}
+
+    def observe(self, labels: tuple, value: float) -> None:
+        series = self.series.get(labels)
+        if series is None:
+            series = self.series[labels] = [0] * len(self.buckets) + [0.0, 0]
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[index] += 1
+        series[-2] += value
+        series[-1] += 1
+
+    def render(self, label_names: tuple) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, series in sorted(self.series.items()):
+            base = ",".join(f'{name}="{value}"' for name, value in zip(label_names, labels))
+            for bound, count in zip(self.buckets, series):
+                lines.append(f'{self.name}_bucket{{{base},le="{bound}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{base},le="+Inf"}} {series[-1]}')
+            lines.append(f"{self.name}_sum{{{base}}} {series[-2]}")
+            lines.append(f"{self.name}_count{{{base}}} {series[-1]}")
+        return lines
+
+
+ROUTE_LABELS = ("method", "route")
+
+request_duration = Histogram("http_request_duration_seconds", "Время обработки запроса", SECONDS_BUCKETS)
+request_db_time = Histogram("http_request_db_seconds", "Время SQL-запросов за запрос", SECONDS_BUCKETS)
+request_db_queries = Histogram("http_request_db_queries", "Количество SQL-запросов за запрос", QUERIES_BUCKETS)
+request_pool_wait = Histogram("http_request_db_pool_wait_seconds", "Ожидание соединения из пула за запрос",
+                              SECONDS_BUCKETS)
+request_serialization = Histogram("http_request_serialization_seconds", "Сериализация ответа за запрос",
+                                  SECONDS_BUCKETS)
+HISTOGRAMS = (request_duration, request_db_time, request_db_queries, request_pool_wait, request_serialization)
+
+# (method, route, status) -> количество
+responses_total: dict[tuple, int] = {}
+
+
+def observe_request(method: str, route: str, status: int, stats: RequestStats) -> None:
+    labels = (method, route)
+    request_duration.observe(labels, time.perf_counter() - stats.started)
+    request_db_time.observe(labels, stats.db_time)
+    request_db_queries.observe(labels, stats.queries)
+    request_pool_wait.observe(labels, stats.pool_wait)
+    request_serialization.observe(labels, stats.serialization)
+    key = (method, route, status)
+    responses_total[key] = responses_total.get(key, 0) + 1
+
+
+def server_timing(stats: RequestStats) -> str:
+    # Server-Timing в миллисекундах: видно в DevTools браузера и в логах клиента
+    total = time.perf_counter() - stats.started
+    return (f'db;dur={stats.db_time * 1000:.2f};desc="{stats.queries} SQL", '
+            f"db-pool;dur={stats.pool_wait * 1000:.2f}, "
+            f"serialize;dur={stats.serialization * 1000:.2f}, "
+            f"total;dur={total * 1000:.2f}")
+
+
+def render_metrics(pools: dict, cache_stats: dict) -> str:
+    # Текстовый формат Prometheus без зависимости от prometheus_client
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines += histogram.render(ROUTE_LABELS)
+    lines += ["# HELP http_responses_total Ответы по маршрутам и кодам", "# TYPE http_responses_total counter"]
+    for (method, route, status), count in sorted(responses_total.items()):
+        lines.append(f'http_responses_total{{method="{method}",route="{route}",status="{status}"}} {count}')
+    lines += ["# HELP response_cache_requests_total Попадания и промахи кэша ответов",
+              "# TYPE response_cache_requests_total counter"]
+    for (namespace, result), count in sorted(cache_stats.items()):
+        lines.append(f'response_cache_requests_total{{namespace="{namespace}",result="{result}"}} {count}')
+    lines += ["# HELP db_pool_connections Соединения пула", "# TYPE db_pool_connections gauge"]
+    for name, pool in pools.items():
+        lines.append(f'db_pool_connections{{pool="{name}",state="checked_out"}} {pool.checkedout()}')
+        lines.append(f'db_pool_connections{{pool="{name}",state="idle"}} {pool.checkedin()}')
+    return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    # Чистый ASGI-middleware: заголовок Server-Timing добавляется к http.response.start,
+    # а наблюдения пишутся в гистограммы после отправки ответа. У потоковых ответов
+    # заголовок уходит раньше тела, поэтому в нём только время до первого байта
+    def __init__(self, app, server_timing: bool = True):
+        self.app = app
+        self.server_timing = server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if self.server_timing:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", server_timing(stats).encode()))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            route = scope.get("route")
+            # Шаблон пути, а не сам путь: /students/{id}, а не /students/42
+            route_path = getattr(route, "path", None) or "unmatched"
+            observe_request(scope["method"], route_path, status, stats)
@@ -10,7 +10,9 @@ from sqlalchemy.ext.asyncio import async_engine_from_config
 
 sys.path.insert(0, dirname(dirname(abspath(__file__)))) # добавил от себя
 
+from app.counters.models import EnrollmentDelta, EnrollmentStat
 from app.database import DATABASE_URL, Base
+from app.jobs.models import Job
 from app.majors.institutes.models import Institute
 from app.majors.models import Major
 from app.students.models import Student
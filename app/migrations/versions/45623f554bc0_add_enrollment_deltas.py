@@ -0,0 +1,51 @@
+"""add enrollment deltas
+
+Revision ID: 45623f554bc0
+Revises: 7b70da09ae6a
+Create Date: 2026-10-18 10:12:40.118204
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '45623f554bc0'
+down_revision: Union[str, Sequence[str], None] = '7b70da09ae6a'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'enrollment_deltas',
+        sa.Column('id', sa.BigInteger(), nullable=False),
+        sa.Column('major_id', sa.Integer(), nullable=False),
+        sa.Column('institute_id', sa.Integer(), nullable=False),
+        sa.Column('delta', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_enrollment_deltas_major_id', 'enrollment_deltas', ['major_id'], unique=False)
+    op.create_index('ix_enrollment_deltas_institute_id', 'enrollment_deltas', ['institute_id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Переносим несвёрнутые изменения в счётчики, чтобы не потерять их
+    op.execute("""
+        UPDATE majors SET count_students = greatest(majors.count_students + d.delta, 0)
+        FROM (SELECT major_id, sum(delta) AS delta FROM enrollment_deltas GROUP BY major_id) AS d
+        WHERE majors.id = d.major_id
+        """)
+    op.execute("""
+        UPDATE institutes SET count_students = greatest(institutes.count_students + d.delta, 0)
+        FROM (SELECT institute_id, sum(delta) AS delta FROM enrollment_deltas GROUP BY institute_id) AS d
+        WHERE institutes.id = d.institute_id
+        """)
+    op.drop_index('ix_enrollment_deltas_institute_id', table_name='enrollment_deltas')
+    op.drop_index('ix_enrollment_deltas_major_id', table_name='enrollment_deltas')
+    op.drop_table('enrollment_deltas')
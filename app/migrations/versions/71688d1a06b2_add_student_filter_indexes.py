@@ -0,0 +1,45 @@
+"""add student filter indexes
+
+Revision ID: 71688d1a06b2
+Revises: 45623f554bc0
+Create Date: 2026-10-18 11:02:17.530911
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '71688d1a06b2'
+down_revision: Union[str, Sequence[str], None] = '45623f554bc0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+STUDENT_INDEXES = [
+    ('ix_students_major_id_course_enrollment_year', ['major_id', 'course', 'enrollment_year']),
+    ('ix_students_institute_id', ['institute_id']),
+    ('ix_students_course_enrollment_year', ['course', 'enrollment_year']),
+    ('ix_students_enrollment_year', ['enrollment_year']),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CONCURRENTLY не блокирует запись в students на время построения индекса,
+    # но не может выполняться внутри транзакции
+    with op.get_context().autocommit_block():
+        for name, columns in STUDENT_INDEXES:
+            op.create_index(name, 'students', columns, unique=False,
+                            postgresql_concurrently=True, if_not_exists=True)
+        op.create_index(op.f('ix_institutes_major_id'), 'institutes', ['major_id'], unique=False,
+                        postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index(op.f('ix_institutes_major_id'), table_name='institutes',
+                      postgresql_concurrently=True, if_exists=True)
+        for name, _ in reversed(STUDENT_INDEXES):
+            op.drop_index(name, table_name='students', postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,47 @@
+"""add student search index
+
+Revision ID: 9a4f2d6b0e17
+Revises: c3e81f7a92d4
+Create Date: 2026-10-18 14:22:06.381920
+
+"""
+import logging
+from typing import Sequence, Union
+
+from alembic import op
+from sqlalchemy.exc import DBAPIError
+
+# revision identifiers, used by Alembic.
+revision: str = '9a4f2d6b0e17'
+down_revision: Union[str, Sequence[str], None] = 'c3e81f7a92d4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+log = logging.getLogger("alembic.runtime.migration")
+
+
+# Выражение должно совпадать с search_document в app/students/models.py
+SEARCH_DOCUMENT = "(first_name || ' ' || last_name || ' ' || email || ' ' || address)"
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # pg_trgm входит в contrib; для CREATE EXTENSION нужны права владельца базы.
+    # Без расширения индекс не создаётся, а приложение запускается с SEARCH_TRGM=False
+    try:
+        with op.get_bind().begin_nested():
+            op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    except DBAPIError as e:
+        log.warning(f"pg_trgm недоступно, индекс поиска не создан, нужен SEARCH_TRGM=False: {e}")
+        return
+    with op.get_context().autocommit_block():
+        op.execute(
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_students_search_trgm "
+            f"ON students USING gin ({SEARCH_DOCUMENT} gin_trgm_ops)"
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_students_search_trgm")
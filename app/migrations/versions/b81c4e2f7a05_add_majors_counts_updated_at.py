@@ -0,0 +1,30 @@
+"""add majors counts_updated_at
+
+Revision ID: b81c4e2f7a05
+Revises: e5b7c1d93a20
+Create Date: 2026-10-18 17:21:06.402518
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = 'b81c4e2f7a05'
+down_revision: Union[str, Sequence[str], None] = 'e5b7c1d93a20'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column(
+        'majors',
+        sa.Column('counts_updated_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False)
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('majors', 'counts_updated_at')
@@ -0,0 +1,67 @@
+"""add enrollment stats
+
+Revision ID: c3e81f7a92d4
+Revises: 71688d1a06b2
+Create Date: 2026-10-18 13:40:52.204117
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = 'c3e81f7a92d4'
+down_revision: Union[str, Sequence[str], None] = '71688d1a06b2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def fold_counters() -> None:
+    # Переносим несвёрнутые изменения в счётчики и очищаем журнал
+    op.execute("""
+        UPDATE majors SET count_students = greatest(majors.count_students + d.delta, 0)
+        FROM (SELECT major_id, sum(delta) AS delta FROM enrollment_deltas GROUP BY major_id) AS d
+        WHERE majors.id = d.major_id
+        """)
+    op.execute("""
+        UPDATE institutes SET count_students = greatest(institutes.count_students + d.delta, 0)
+        FROM (SELECT institute_id, sum(delta) AS delta FROM enrollment_deltas GROUP BY institute_id) AS d
+        WHERE institutes.id = d.institute_id
+        """)
+    op.execute("DELETE FROM enrollment_deltas")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # В старых записях журнала нет курса и года, поэтому журнал сворачивается до изменения таблицы
+    op.execute("LOCK TABLE enrollment_deltas IN EXCLUSIVE MODE")
+    fold_counters()
+    op.add_column('enrollment_deltas', sa.Column('course', sa.Integer(), nullable=False))
+    op.add_column('enrollment_deltas', sa.Column('enrollment_year', sa.Integer(), nullable=False))
+    op.create_table(
+        'enrollment_stats',
+        sa.Column('major_id', sa.Integer(), nullable=False),
+        sa.Column('institute_id', sa.Integer(), nullable=False),
+        sa.Column('course', sa.Integer(), nullable=False),
+        sa.Column('enrollment_year', sa.Integer(), nullable=False),
+        sa.Column('students', sa.Integer(), server_default=sa.text('0'), nullable=False),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('major_id', 'institute_id', 'course', 'enrollment_year')
+    )
+    op.execute("""
+        INSERT INTO enrollment_stats (major_id, institute_id, course, enrollment_year, students)
+        SELECT major_id, institute_id, course, enrollment_year, count(*)
+        FROM students
+        GROUP BY major_id, institute_id, course, enrollment_year
+        """)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("LOCK TABLE enrollment_deltas IN EXCLUSIVE MODE")
+    fold_counters()
+    op.drop_table('enrollment_stats')
+    op.drop_column('enrollment_deltas', 'enrollment_year')
+    op.drop_column('enrollment_deltas', 'course')
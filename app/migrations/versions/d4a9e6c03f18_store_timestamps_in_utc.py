@@ -0,0 +1,47 @@
+"""store timestamps in utc
+
+Revision ID: d4a9e6c03f18
+Revises: b81c4e2f7a05
+Create Date: 2026-10-18 17:48:31.275064
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4a9e6c03f18'
+down_revision: Union[str, Sequence[str], None] = 'b81c4e2f7a05'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Колонки без часового пояса: now() писал в них время часового пояса сессии,
+# теперь значения по умолчанию всегда в UTC (app.database.utc_now)
+TIMESTAMP_COLUMNS = [
+    ('majors', 'created_at'),
+    ('majors', 'updated_at'),
+    ('majors', 'counts_updated_at'),
+    ('institutes', 'created_at'),
+    ('institutes', 'updated_at'),
+    ('students', 'created_at'),
+    ('students', 'updated_at'),
+    ('enrollment_deltas', 'created_at'),
+    ('enrollment_deltas', 'updated_at'),
+    ('enrollment_stats', 'created_at'),
+    ('enrollment_stats', 'updated_at'),
+    ('jobs', 'created_at'),
+    ('jobs', 'updated_at'),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table, column in TIMESTAMP_COLUMNS:
+        op.alter_column(table, column, server_default=sa.text("timezone('utc', now())"))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table, column in TIMESTAMP_COLUMNS:
+        op.alter_column(table, column, server_default=sa.text('now()'))
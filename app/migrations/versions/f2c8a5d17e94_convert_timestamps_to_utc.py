@@ -0,0 +1,72 @@
+"""convert timestamps to utc
+
+Revision ID: f2c8a5d17e94
+Revises: d4a9e6c03f18
+Create Date: 2026-10-18 19:12:40.518337
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import context, op
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2c8a5d17e94'
+down_revision: Union[str, Sequence[str], None] = 'd4a9e6c03f18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Значения, записанные до d4a9e6c03f18: now() в значениях по умолчанию писал время часового пояса сессии,
+# datetime.now() в onupdate и заданиях - время часового пояса процесса приложения
+TIMESTAMP_COLUMNS = [
+    ('majors', 'created_at'),
+    ('majors', 'updated_at'),
+    ('majors', 'counts_updated_at'),
+    ('institutes', 'created_at'),
+    ('institutes', 'updated_at'),
+    ('students', 'created_at'),
+    ('students', 'updated_at'),
+    ('enrollment_deltas', 'created_at'),
+    ('enrollment_deltas', 'updated_at'),
+    ('enrollment_stats', 'created_at'),
+    ('enrollment_stats', 'updated_at'),
+    ('jobs', 'created_at'),
+    ('jobs', 'updated_at'),
+    ('jobs', 'started_at'),
+    ('jobs', 'finished_at'),
+]
+UTC_ZONES = {'UTC', 'Etc/UTC', 'GMT', 'Etc/GMT', 'Zulu', 'Etc/Zulu'}
+
+
+def source_timezone() -> str:
+    # По умолчанию старые значения считаются записанными в часовом поясе сессии БД.
+    # Если приложение работало в другом поясе, его передают явно:
+    #     alembic -x source_timezone=Europe/Moscow upgrade head
+    timezone = context.get_x_argument(as_dictionary=True).get('source_timezone')
+    if timezone:
+        return timezone
+    return op.get_bind().execute(sa.text("SELECT current_setting('TimeZone')")).scalar_one()
+
+
+def convert(source: str, target: str) -> None:
+    # timestamp AT TIME ZONE source - момент времени, AT TIME ZONE target - он же без пояса в target
+    for table, column in TIMESTAMP_COLUMNS:
+        op.execute(
+            sa.text(f"UPDATE {table} SET {column} = ({column} AT TIME ZONE :source) AT TIME ZONE :target "
+                    f"WHERE {column} IS NOT NULL")
+            .bindparams(source=source, target=target)
+        )
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    timezone = source_timezone()
+    if timezone not in UTC_ZONES:
+        convert(timezone, 'UTC')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    timezone = source_timezone()
+    if timezone not in UTC_ZONES:
+        convert('UTC', timezone)
@@ -0,0 +1,221 @@
+"""Генерация большого количества студентов для нагрузочного тестирования.
+
+Студент с номером index при одном и том же --seed всегда одинаковый, независимо от
+--workers, --batch-size и содержимого базы, поэтому прогоны воспроизводимы. У каждого seed
+свой диапазон телефонов и email, внутри него они не повторяются для разных index: прогоны
+с разными --seed (меньше 100000) не пересекаются. Повторный прогон того же seed по уже записанным index
+COPY не запишет (ошибка уникальности), а --method insert пропустит занятые строки.
+Строки пишутся пачками через COPY (или многострочными INSERT) несколькими параллельными
+задачами, а count_students пересчитывается один раз в конце.
+
+    python -m app.seed --students 1000000 --seed 42 --workers 4
+    python -m app.seed --students 500000 --offset 1000000   # дописать следующие 500 тысяч
+    python -m app.seed --students 500000 --seed 43           # ещё 500 тысяч других студентов
+"""
+import argparse
+import asyncio
+import time
+from bisect import bisect_right
+from datetime import date
+from itertools import accumulate
+
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+
+from app.counters.dao import CounterDAO
+from app.database import engine
+from app.enums import MajorEnum, institutes_enum
+from app.logger import log
+from app.majors.dao import MajorDAO
+from app.majors.reference_cache import reference_cache
+from app.students.models import Student
+
+
+# Последний год набора, который принимает StudentSchema
+LAST_ENROLLMENT_YEAR = 2023
+
+# К старшим курсам студентов меньше: часть отчисляется
+COURSE_WEIGHTS = {1: 26, 2: 23, 3: 20, 4: 17, 5: 14}
+MAJOR_WEIGHTS = {
+    MajorEnum.informatics: 18,
+    MajorEnum.economics: 16,
+    MajorEnum.law: 15,
+    MajorEnum.engineering: 12,
+    MajorEnum.medicine: 10,
+    MajorEnum.psychology: 8,
+    MajorEnum.languages: 8,
+    MajorEnum.media: 7,
+    MajorEnum.sport: 6,
+}
+# Сколько лет прошло между 17-летием и поступлением
+ENTRY_AGE_WEIGHTS = {0: 60, 1: 25, 2: 8, 3: 4, 4: 3}
+# Доля студентов, поступивших на год раньше своего курса (академический отпуск, повторный курс), в процентах
+REPEAT_YEAR_PERCENT = 6
+
+FIRST_NAMES = (
+    ("Александр", "Дмитрий", "Максим", "Иван", "Артём", "Никита", "Михаил", "Егор", "Андрей", "Кирилл",
+     "Илья", "Алексей", "Роман", "Сергей", "Владимир", "Тимур", "Павел", "Николай", "Денис", "Глеб"),
+    ("Анастасия", "Мария", "Анна", "Дарья", "Екатерина", "Полина", "Виктория", "Елизавета", "Софья", "Алина",
+     "Ксения", "Валерия", "Вероника", "Арина", "Юлия", "Ольга", "Татьяна", "Наталья", "Ирина", "Алиса"),
+)
+LAST_NAMES = (
+    ("Иванов", "Смирнов", "Кузнецов", "Попов", "Васильев", "Петров", "Соколов", "Михайлов", "Новиков",
+     "Фёдоров", "Морозов", "Волков", "Алексеев", "Лебедев", "Семёнов", "Егоров", "Павлов", "Козлов",
+     "Степанов", "Николаев"),
+    ("Иванова", "Смирнова", "Кузнецова", "Попова", "Васильева", "Петрова", "Соколова", "Михайлова",
+     "Новикова", "Фёдорова", "Морозова", "Волкова", "Алексеева", "Лебедева", "Семёнова", "Егорова",
+     "Павлова", "Козлова", "Степанова", "Николаева"),
+)
+CITIES = ("Москва", "Санкт-Петербург", "Казань", "Новосибирск", "Екатеринбург", "Нижний Новгород",
+          "Самара", "Ростов-на-Дону", "Краснодар", "Воронеж")
+STREETS = ("Ленина", "Мира", "Советская", "Гагарина", "Молодёжная", "Школьная", "Садовая", "Лесная",
+           "Центральная", "Студенческая")
+
+# Порядок колонок COPY и INSERT
+STUDENT_COLUMNS = (
+    "first_name", "last_name", "date_of_birth", "phone_number", "email", "address",
+    "enrollment_year", "course", "special_notes", "major_name", "institute_name",
+)
+# Множитель взаимно прост с 10**9, поэтому index -> номер телефона - биекция для index < 10**9.
+# Перед номером - seed по модулю PHONE_SEED_SLOTS: +7, 5 цифр seed и 9 цифр index - 15 цифр,
+# больше StudentSchema не принимает
+PHONE_MULTIPLIER = 387_420_489
+PHONE_SEED_SLOTS = 10**5
+MASK64 = (1 << 64) - 1
+
+
+def _weighted(weights: dict) -> tuple[list, list[int], int]:
+    values = list(weights)
+    bounds = list(accumulate(weights.values()))
+    return values, bounds, bounds[-1]
+
+
+COURSES = _weighted(COURSE_WEIGHTS)
+MAJORS = _weighted(MAJOR_WEIGHTS)
+ENTRY_AGES = _weighted(ENTRY_AGE_WEIGHTS)
+
+
+def _pick(table: tuple[list, list[int], int], value: int):
+    values, bounds, total = table
+    return values[bisect_right(bounds, value % total)]
+
+
+def _mix(seed: int, index: int) -> int:
+    # splitmix64: дешёвый детерминированный хеш вместо random.Random на каждую строку
+    z = (seed * 0x9E3779B97F4A7C15 + index * 0xBF58476D1CE4E5B9 + 0x94D049BB133111EB) & MASK64
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & MASK64
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & MASK64
+    return z ^ (z >> 31)
+
+
+def generate_student(index: int, seed: int) -> dict:
+    # Поля как у StudentSchema: специальность и институт - названиями
+    h = _mix(seed, index)
+    h2 = _mix(seed, index ^ MASK64)
+    gender = h & 1
+    course = _pick(COURSES, h >> 1)
+    enrollment_year = LAST_ENROLLMENT_YEAR - course + 1
+    if (h >> 9) % 100 < REPEAT_YEAR_PERCENT:
+        enrollment_year -= 1
+    birth_year = enrollment_year - 17 - _pick(ENTRY_AGES, h >> 17)
+    major = _pick(MAJORS, h >> 25)
+    institutes = institutes_enum[major]
+    return {
+        "first_name": FIRST_NAMES[gender][(h >> 33) % 20],
+        "last_name": LAST_NAMES[gender][(h >> 41) % 20],
+        "date_of_birth": date(birth_year, h2 % 12 + 1, (h2 >> 4) % 28 + 1),
+        "phone_number": f"+7{seed % PHONE_SEED_SLOTS:05d}{index * PHONE_MULTIPLIER % 10**9:09d}",
+        "email": f"student{index}.{seed}@example.edu",
+        "address": (f"г. {CITIES[(h2 >> 9) % len(CITIES)]}, ул. {STREETS[(h2 >> 17) % len(STREETS)]}, "
+                    f"д. {(h2 >> 25) % 150 + 1}, кв. {(h2 >> 33) % 300 + 1}"),
+        "enrollment_year": enrollment_year,
+        "course": course,
+        "special_notes": None,
+        "major_name": major.value,
+        "institute_name": institutes[(h >> 49) % len(institutes)],
+    }
+
+
+def student_record(index: int, seed: int, major_ids: dict[str, int], institute_ids: dict[str, int]) -> tuple:
+    student = generate_student(index, seed)
+    student["major_name"] = major_ids[student["major_name"]]
+    student["institute_name"] = institute_ids[student["institute_name"]]
+    return tuple(student[column] for column in STUDENT_COLUMNS)
+
+
+# В таблице вместо названий - id специальности и института
+TABLE_COLUMNS = STUDENT_COLUMNS[:-2] + ("major_id", "institute_id")
+
+
+async def write_copy(records: list[tuple]) -> int:
+    async with engine.connect() as conn:
+        raw = await conn.get_raw_connection()
+        driver = raw.driver_connection
+        async with driver.transaction():
+            await driver.copy_records_to_table(Student.__tablename__, records=records, columns=TABLE_COLUMNS)
+    return len(records)
+
+
+async def write_insert(records: list[tuple]) -> int:
+    # Повторный запуск с тем же seed и offset не падает: занятые строки пропускаются
+    rows = [dict(zip(TABLE_COLUMNS, record)) for record in records]
+    async with engine.begin() as conn:
+        result = await conn.execute(pg_insert(Student).on_conflict_do_nothing().returning(Student.id), rows)
+        return len(result.all())
+
+
+WRITERS = {"copy": write_copy, "insert": write_insert}
+
+
+async def seed_students(count: int, seed: int = 42, offset: int = 0, workers: int = 4,
+                        batch_size: int = 10_000, method: str = "copy") -> int:
+    reference = await reference_cache.get(force=True)
+    if not reference.major_ids:
+        await MajorDAO.sync_with_enums()
+        reference = await reference_cache.get(force=True)
+    major_ids, institute_ids = reference.major_ids, reference.institute_ids
+    write = WRITERS[method]
+
+    batches: asyncio.Queue = asyncio.Queue()
+    for start in range(offset, offset + count, batch_size):
+        batches.put_nowait((start, min(start + batch_size, offset + count)))
+
+    inserted = 0
+    started = time.perf_counter()
+
+    # Пока одна задача ждёт COPY, другая генерирует следующую пачку
+    async def worker():
+        nonlocal inserted
+        while not batches.empty():
+            start, end = batches.get_nowait()
+            records = [student_record(index, seed, major_ids, institute_ids) for index in range(start, end)]
+            inserted += await write(records)
+            elapsed = time.perf_counter() - started
+            log.info(f"Студентов добавлено: {inserted}/{count}, {inserted / elapsed:.0f} строк/с")
+
+    await asyncio.gather(*(worker() for _ in range(workers)))
+
+    # Счётчики пересчитываются по итоговой таблице один раз, а не на каждую строку
+    await CounterDAO.rebuild()
+    async with engine.begin() as conn:
+        await conn.execute(text(f"ANALYZE {Student.__tablename__}"))
+    return inserted
+
+
+async def main(args) -> None:
+    inserted = await seed_students(args.students, seed=args.seed, offset=args.offset, workers=args.workers,
+                                   batch_size=args.batch_size, method=args.method)
+    log.info(f"Готово: добавлено {inserted} студентов, счётчики пересчитаны")
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--students", type=int, default=1_000_000, help="Сколько студентов добавить")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--offset", type=int, default=0, help="Номер первого студента")
+    parser.add_argument("--workers", type=int, default=4, help="Параллельных задач записи")
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    parser.add_argument("--method", choices=sorted(WRITERS), default="copy",
+                        help="copy - быстрее, insert - пропускает уже существующие строки")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,54 @@
+from sqlalchemy import func, select, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.counters.models import EnrollmentDelta, EnrollmentStat
+from app.dao.session import session_scope
+from app.majors.institutes.models import Institute
+from app.majors.models import Major
+from app.stats.schemas import EnrollmentDimension
+
+
+# Колонки ключа сводки, по которым можно группировать и фильтровать
+KEY_COLUMNS = ("major_id", "institute_id", "course", "enrollment_year")
+DIMENSION_COLUMNS = {
+    EnrollmentDimension.major: "major_id",
+    EnrollmentDimension.institute: "institute_id",
+    EnrollmentDimension.course: "course",
+    EnrollmentDimension.enrollment_year: "enrollment_year",
+}
+
+
+class StatsDAO:
+    @classmethod
+    async def enrollment(cls, group_by: list[EnrollmentDimension], session: AsyncSession | None = None,
+                         **filter_by) -> list[dict]:
+        # Сводка enrollment_stats плюс ещё не свёрнутые записи журнала: ответ сразу учитывает
+        # последние изменения, а читается несколько сотен строк вместо всей таблицы students
+        filter_by = {key: value for key, value in filter_by.items() if value is not None}
+        parts = []
+        for model, amount in ((EnrollmentStat, EnrollmentStat.students), (EnrollmentDelta, EnrollmentDelta.delta)):
+            columns = [getattr(model, name) for name in KEY_COLUMNS]
+            conditions = [getattr(model, name) == value for name, value in filter_by.items()]
+            parts.append(select(*columns, amount.label("students")).where(*conditions))
+        combined = union_all(*parts).subquery()
+
+        keys = [combined.c[DIMENSION_COLUMNS[dimension]] for dimension in dict.fromkeys(group_by)]
+        columns = list(keys)
+        query = select(combined)
+        if EnrollmentDimension.major in group_by:
+            columns.append(Major.major_name)
+            query = query.outerjoin(Major, Major.id == combined.c.major_id)
+        if EnrollmentDimension.institute in group_by:
+            columns.append(Institute.institute_name)
+            query = query.outerjoin(Institute, Institute.id == combined.c.institute_id)
+
+        students = func.sum(combined.c.students)
+        query = (
+            query.with_only_columns(*columns, students.label("students"))
+            .group_by(*columns)
+            .having(students > 0)
+            .order_by(*keys)
+        )
+        async with session_scope(session, read_only=True) as session:
+            result = await session.execute(query)
+            return [dict(row) for row in result.mappings().all()]
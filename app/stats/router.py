@@ -0,0 +1,23 @@
+from fastapi import APIRouter, Query
+
+from app.dao.session import ReadSessionDep
+from app.stats.dao import StatsDAO
+from app.stats.schemas import EnrollmentDimension, SEnrollmentStats
+
+
+router = APIRouter(prefix='/stats', tags=['Статистика'])
+
+
+@router.get("/enrollment", summary="Количество студентов в разрезе специальности, института, курса и года",
+            response_model_exclude_unset=True)
+async def get_enrollment_stats(
+    session: ReadSessionDep,
+    group_by: list[EnrollmentDimension] = Query([], description="Измерения группировки, можно несколько"),
+    major_id: int | None = Query(None),
+    institute_id: int | None = Query(None),
+    course: int | None = Query(None, ge=1, le=5),
+    enrollment_year: int | None = Query(None),
+) -> SEnrollmentStats:
+    items = await StatsDAO.enrollment(group_by, session=session, major_id=major_id, institute_id=institute_id,
+                                      course=course, enrollment_year=enrollment_year)
+    return {"group_by": group_by, "total": sum(item["students"] for item in items), "items": items}
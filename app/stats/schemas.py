@@ -0,0 +1,26 @@
+from enum import Enum
+
+from pydantic import BaseModel, Field
+
+
+class EnrollmentDimension(str, Enum):
+    major = "major"
+    institute = "institute"
+    course = "course"
+    enrollment_year = "enrollment_year"
+
+
+class SEnrollmentGroup(BaseModel):
+    major_id: int | None = None
+    major_name: str | None = None
+    institute_id: int | None = None
+    institute_name: str | None = None
+    course: int | None = None
+    enrollment_year: int | None = None
+    students: int = Field(description="Количество студентов в группе")
+
+
+class SEnrollmentStats(BaseModel):
+    group_by: list[EnrollmentDimension]
+    total: int = Field(description="Количество студентов по всем группам")
+    items: list[SEnrollmentGroup]
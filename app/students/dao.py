@@ -1,121 +1,385 @@
+from collections import Counter
+from typing import Awaitable, Callable
+
 from sqlalchemy import delete as sqlalchemy_delete
-from sqlalchemy import func, insert, select
-from sqlalchemy import update as sqlalchemy_update
+from sqlalchemy import Integer, any_, bindparam, case, func, insert, or_, select
+from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, raiseload, selectinload
 
+from app.config import settings
+from app.counters.dao import CounterDAO, EnrollmentKey
 from app.dao.base import BaseDAO
-from app.database import async_session_maker
+from app.dao.session import session_scope
+from app.diagnostics import batched
 from app.exceptions import BadRequestError, ConflictError, NotFoundError
 from app.majors.institutes.models import Institute
 from app.majors.models import Major
-from app.students.models import Student
+from app.majors.reference_cache import reference_cache
+from app.students.models import Student, search_document
+
+
+# Короче трёх символов в слове нет ни одной триграммы, и индекс ему не помогает
+SEARCH_MIN_TERM_LENGTH = 3
+SEARCH_MAX_TERMS = 5
+
+
+def escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
 
 
 class StudentDAO(BaseDAO):
     model = Student
 
+    # Порядок колонок выгрузки совпадает с Student.to_dict
+    export_columns = (
+        "id", "first_name", "last_name", "date_of_birth", "phone_number", "email", "address",
+        "enrollment_year", "course", "special_notes", "major_id", "institute_id",
+    )
+
+    # Списку нужен только major_name: специальностей мало, их выгоднее догрузить одним IN-запросом,
+    # чем повторять в каждой строке join'а. Одиночному студенту хватает одного запроса с join
+    load_profiles = {
+        "list": (selectinload(Student.major), raiseload(Student.institute)),
+        "detail": (joinedload(Student.major), joinedload(Student.institute)),
+    }
+
+    # major_name берётся join'ом с majors, только если его запросили в fields
+    extra_fields = {"major_name": (Major.major_name, Student.major)}
+
+    # В ответах есть major_name, поэтому переименование специальности меняет версию её студентов
+    version_columns = ((Major.updated_at, Student.major),)
+
     @classmethod
-    async def add_student(cls, student_data: dict):
-        async with async_session_maker() as session:
-            async with session.begin():
-                try:
-                    # Получаем объект major
-                    major_name = student_data.get("major_name")
-                    if not major_name:
-                        raise BadRequestError("Поле major_name обязательно")
-
-                    result = await session.execute(
-                        select(Major).where(Major.major_name == major_name)
-                    )
-                    major = result.scalar_one_or_none()
-                    if major is None:
-                        raise NotFoundError(f"Специальность '{major_name}' не была найдена")
+    def _filter_conditions(cls, **filter_by) -> list:
+        # major_name и institute_name из QueryParamsStudent не являются колонками students,
+        # поэтому фильтруем по ним через связанные таблицы
+        conditions = []
+        for key, value in filter_by.items():
+            if key == "major_name":
+                conditions.append(cls.model.major.has(Major.major_name == value))
+            elif key == "institute_name":
+                conditions.append(cls.model.institute.has(Institute.institute_name == value))
+            else:
+                conditions.append(getattr(cls.model, key) == value)
+        return conditions
 
-                    # Получаем объект institute
-                    institute_name = student_data.get("institute_name")
-                    if not institute_name:
-                        raise BadRequestError("Поле institute_name обязательно")
+    @classmethod
+    async def stream_all(cls, chunk_size: int = 1000, **filter_by):
+        # Серверный курсор: строки приходят порциями по chunk_size, без загрузки всей таблицы
+        columns = [getattr(cls.model, name) for name in cls.export_columns]
+        query = (
+            select(*columns)
+            .where(*cls._filter_conditions(**filter_by))
+            .order_by(cls.model.id)
+            .execution_options(yield_per=chunk_size)
+        )
+        async with session_scope(read_only=True) as session:
+            result = await session.stream(query)
+            async for partition in result.partitions(chunk_size):
+                yield partition
 
-                    result = await session.execute(
-                        select(Institute).where(Institute.institute_name == institute_name)
-                    )
-                    institute = result.scalar_one_or_none()
-                    if institute is None:
-                        raise NotFoundError(f"Институт '{institute_name}' не был найден")
-
-                    # Убираем ненужные поля, чтобы SQLAlchemy не ругался
-                    student_data_clean = {k: v for k, v in student_data.items() if k not in ("id", "major_name", "institute_name")}
-                    student_data_clean["major_id"] = major.id
-                    student_data_clean["institute_id"] = institute.id
-                        
-                    # добавляем студента в бд
+    @classmethod
+    async def search(cls, q: str, limit: int, fields: list[str] | None = None,
+                     session: AsyncSession | None = None):
+        # Каждое слово запроса должно встретиться в имени, фамилии, email или адресе.
+        # С pg_trgm отбор идёт по триграммному индексу, а порядок - по word_similarity.
+        # Без него (settings.SEARCH_TRGM = False) работает тот же ILIKE полным просмотром,
+        # а выше ставятся студенты, у которых с первого слова начинается фамилия, имя или email
+        terms = q.split()[:SEARCH_MAX_TERMS]
+        if not any(len(term) >= SEARCH_MIN_TERM_LENGTH for term in terms):
+            raise BadRequestError(f"Нужно хотя бы одно слово не короче {SEARCH_MIN_TERM_LENGTH} символов")
+        conditions = [search_document.ilike(f"%{escape_like(term)}%", escape="\\") for term in terms]
+
+        async with session_scope(session, read_only=True) as session:
+            if settings.SEARCH_TRGM:
+                rank = func.word_similarity(" ".join(terms), search_document)
+            else:
+                prefix = f"{escape_like(terms[0])}%"
+                rank = case(
+                    (cls.model.last_name.ilike(prefix, escape="\\"), 3),
+                    (cls.model.first_name.ilike(prefix, escape="\\"), 2),
+                    (cls.model.email.ilike(prefix, escape="\\"), 1),
+                    else_=0,
+                )
+            query = (
+                cls._select(fields, "list")
+                .where(*conditions)
+                .order_by(rank.desc(), cls.model.id)
+                .limit(limit)
+            )
+            result = await session.execute(query)
+            return cls._rows(result, fields)
+
+    @classmethod
+    async def find_by_ids(cls, ids: list[int], fields: list[str] | None = None,
+                          session: AsyncSession | None = None) -> tuple[list, list[int]]:
+        # Один запрос на весь список с теми же профилями загрузки, что и у find_all.
+        # Возвращает найденных студентов в порядке ids (без повторов) и id, которых нет в базе
+        ids = list(dict.fromkeys(ids))
+        async with session_scope(session, read_only=True) as session:
+            if session.get_bind().dialect.name == "postgresql":
+                # id = ANY(:ids) - один параметр-массив: план запроса не зависит от длины списка
+                condition = cls.model.id == any_(bindparam("ids", ids, type_=ARRAY(Integer)))
+            else:
+                condition = cls.model.id.in_(ids)
+            result = await session.execute(cls._select(fields, "list").where(condition))
+            rows = cls._rows(result, fields)
+
+        by_id = {row["id"] if fields else row.id: row for row in rows}
+        found = [by_id[student_id] for student_id in ids if student_id in by_id]
+        missing = [student_id for student_id in ids if student_id not in by_id]
+        return found, missing
+
+    @staticmethod
+    async def reference_ids(major_name: str | None, institute_name: str | None) -> tuple[int, int]:
+        if not major_name:
+            raise BadRequestError("Поле major_name обязательно")
+        if not institute_name:
+            raise BadRequestError("Поле institute_name обязательно")
+
+        # id специальности и института берём из кэша справочников,
+        # при промахе перечитываем справочники один раз
+        reference = await reference_cache.get()
+        if major_name not in reference.major_ids or institute_name not in reference.institute_ids:
+            reference = await reference_cache.get(force=True)
+        major_id = reference.major_ids.get(major_name)
+        if major_id is None:
+            raise NotFoundError(f"Специальность '{major_name}' не была найдена")
+        institute_id = reference.institute_ids.get(institute_name)
+        if institute_id is None:
+            raise NotFoundError(f"Институт '{institute_name}' не был найден")
+        if institute_name not in reference.institutes_by_major.get(major_id, ()):
+            raise BadRequestError(f"Институт '{institute_name}' не относится к специальности '{major_name}'")
+        return major_id, institute_id
+
+    @classmethod
+    async def add_student(cls, student_data: dict, session: AsyncSession | None = None):
+        major_id, institute_id = await cls.reference_ids(student_data.get("major_name"),
+                                                         student_data.get("institute_name"))
+
+        async with session_scope(session) as session:
+            try:
+                # Убираем ненужные поля, чтобы SQLAlchemy не ругался
+                student_data_clean = {k: v for k, v in student_data.items() if k not in ("id", "major_name", "institute_name")}
+                student_data_clean["major_id"] = major_id
+                student_data_clean["institute_id"] = institute_id
+                    
+                # добавляем студента в бд
+                stmt = (
+                    insert(cls.model)
+                    .values(**student_data_clean)
+                    .returning(cls.model.id)
+                )
+                result = await session.execute(stmt)
+                new_student_id = result.scalar_one()
+
+                # Увеличиваем счётчик студентов для специальности и института через журнал,
+                # не блокируя строки majors/institutes до конца транзакции
+                key = EnrollmentKey(major_id, institute_id, student_data["course"], student_data["enrollment_year"])
+                await CounterDAO.record(key, 1, session=session)
+
+                return new_student_id
+            
+            except IntegrityError as e:
+                raise ConflictError(str(e.orig))
+            
+
+    @classmethod
+    async def add_students_bulk(cls, students_data: list[dict], batch_size: int = 1000,
+                                session: AsyncSession | None = None) -> dict:
+        # students_data - уже провалидированные StudentSchema.model_dump(), индекс в списке - номер строки
+        errors: list[dict] = []
+        inserted = 0
+
+        # id специальностей и институтов берём из кэша справочников
+        reference = await reference_cache.get()
+        names_missing = any(
+            row["major_name"] not in reference.major_ids or row["institute_name"] not in reference.institute_ids
+            for row in students_data
+        )
+        if names_missing:
+            reference = await reference_cache.get(force=True)
+        major_ids = reference.major_ids
+        institute_ids = reference.institute_ids
+
+        async with session_scope(session) as session:
+            # Одним запросом находим уже занятые email и телефоны
+            emails = {row["email"] for row in students_data}
+            phones = {row["phone_number"] for row in students_data}
+            result = await session.execute(
+                select(cls.model.email, cls.model.phone_number)
+                .where(or_(cls.model.email.in_(emails), cls.model.phone_number.in_(phones)))
+            )
+            taken_emails: set[str] = set()
+            taken_phones: set[str] = set()
+            for email, phone in result.all():
+                taken_emails.add(email)
+                taken_phones.add(phone)
+
+            to_insert: dict[str, tuple[int, dict]] = {}
+            for index, row in enumerate(students_data):
+                major_id = major_ids.get(row["major_name"])
+                institute_id = institute_ids.get(row["institute_name"])
+                if major_id is None:
+                    errors.append({"row": index, "detail": f"Специальность '{row['major_name']}' не была найдена"})
+                    continue
+                if institute_id is None:
+                    errors.append({"row": index, "detail": f"Институт '{row['institute_name']}' не был найден"})
+                    continue
+                if row["institute_name"] not in reference.institutes_by_major.get(major_id, ()):
+                    errors.append({"row": index, "detail": f"Институт '{row['institute_name']}' не относится "
+                                                           f"к специальности '{row['major_name']}'"})
+                    continue
+                if row["email"] in taken_emails:
+                    errors.append({"row": index, "detail": f"Email {row['email']} уже используется"})
+                    continue
+                if row["phone_number"] in taken_phones:
+                    errors.append({"row": index, "detail": f"Телефон {row['phone_number']} уже используется"})
+                    continue
+                taken_emails.add(row["email"])
+                taken_phones.add(row["phone_number"])
+
+                values = {k: v for k, v in row.items() if k not in ("id", "major_name", "institute_name")}
+                values["major_id"] = major_id
+                values["institute_id"] = institute_id
+                to_insert[row["email"]] = (index, values)
+
+            deltas: Counter[EnrollmentKey] = Counter()
+            pending = list(to_insert.values())
+
+            # Многострочные INSERT пачками; ON CONFLICT DO NOTHING защищает от гонки
+            # с параллельными вставками, не прерывая всю пачку
+            with batched():
+                for start in range(0, len(pending), batch_size):
+                    batch = pending[start:start + batch_size]
                     stmt = (
-                        insert(cls.model)
-                        .values(**student_data_clean)
-                        .returning(cls.model.id, cls.model.major_id, cls.model.institute_id)
+                        pg_insert(cls.model)
+                        .values([values for _, values in batch])
+                        .on_conflict_do_nothing()
+                        .returning(cls.model.email, cls.model.major_id, cls.model.institute_id,
+                                   cls.model.course, cls.model.enrollment_year)
                     )
                     result = await session.execute(stmt)
-                    new_student_id, major_id, institute_id = result.fetchone()
+                    inserted_emails = set()
+                    for email, *key in result.all():
+                        inserted_emails.add(email)
+                        deltas[EnrollmentKey(*key)] += 1
+                    inserted += len(inserted_emails)
 
-                    # Увеличиваем счётчик студентов для специальности и института
-                    await session.execute(
-                        sqlalchemy_update(Major)
-                        .where(Major.id == major_id)
-                        .values(count_students=Major.count_students + 1)
-                    )
+                    for index, values in batch:
+                        if values["email"] not in inserted_emails:
+                            errors.append({"row": index, "detail": "Email или телефон уже используется"})
 
-                    await session.execute(
-                        sqlalchemy_update(Institute)
-                        .where(Institute.id == institute_id)
-                        .values(count_students=Institute.count_students + 1)
-                    )
+            # Одна суммарная запись в журнал счётчиков на каждую комбинацию специальности,
+            # института, курса и года
+            await CounterDAO.record_many(deltas, session=session)
+
+        errors.sort(key=lambda error: error["row"])
+        return {"inserted": inserted, "rejected": len(errors), "errors": errors}
+
+
+    @classmethod
+    async def update_student(cls, student_id: int, session: AsyncSession | None = None, **values):
+        async with session_scope(session) as session:
+            result = await session.execute(
+                select(cls.model.major_id, cls.model.institute_id, cls.model.course, cls.model.enrollment_year)
+                .where(cls.model.id == student_id)
+                .with_for_update()
+            )
+            old = result.first()
+            if old is None:
+                return None
+            try:
+                updated = await cls.update({"id": student_id}, session=session, **values)
+            except IntegrityError as e:
+                raise ConflictError(str(e.orig))
+
+            # Студент перешёл на другую специальность, в другой институт или на другой курс -
+            # переносим счётчики и сводку
+            old_key = EnrollmentKey(*old)
+            new_key = EnrollmentKey(updated.major_id, updated.institute_id, updated.course, updated.enrollment_year)
+            if old_key != new_key:
+                await CounterDAO.record_many(Counter({old_key: -1, new_key: 1}), session=session)
+            return updated
 
-                    return new_student_id
-                
-                except IntegrityError as e:
-                    raise ConflictError(str(e.orig))
-            
 
     @classmethod
-    async def delete_student(cls, **student_data):
+    async def delete_student(cls, session: AsyncSession | None = None, **student_data):
         if not student_data:
             raise ValueError("Необходимо указать хотя бы один параметр для удаления студента")
 
-        async with async_session_maker() as session:
-            async with session.begin():
-                # Находим студента
-                query = (
-                    select(
-                        cls.model.id,
-                        cls.model.major_id,
-                        cls.model.institute_id,
-                    ).filter_by(**student_data)
-                )
-                
-                result = await session.execute(query)
-                student = result.first()  # возвращает tuple (id, major_id, institute_id)
-
-                if not student:
-                    raise NotFoundError(f"Студент с параметром {student_data} не найден")
-                
-                student_id, major_id, institute_id = student
-
-                # Удаляем студента
-                await session.execute(
-                    sqlalchemy_delete(cls.model).where(cls.model.id == student_id)
-                )
+        async with session_scope(session) as session:
+            # Находим студента
+            query = (
+                select(
+                    cls.model.id,
+                    cls.model.major_id,
+                    cls.model.institute_id,
+                    cls.model.course,
+                    cls.model.enrollment_year,
+                ).filter_by(**student_data)
+            )
+            
+            result = await session.execute(query)
+            student = result.first()  # возвращает tuple (id, major_id, institute_id, course, enrollment_year)
 
-                # Уменьшаем счетчик студентов по специальности и институту
-                await session.execute(
-                    sqlalchemy_update(Major)
-                    .where(Major.id == major_id)
-                    .values(count_students=func.greatest(Major.count_students - 1, 0))
-                )
-                await session.execute(
-                    sqlalchemy_update(Institute)
-                    .where(Institute.id == institute_id)
-                    .values(count_students=func.greatest(Institute.count_students - 1, 0))
-                )
+            if not student:
+                raise NotFoundError(f"Студент с параметром {student_data} не найден")
+            
+            student_id, *key = student
 
-                return True
+            # Удаляем студента
+            await session.execute(
+                sqlalchemy_delete(cls.model).where(cls.model.id == student_id)
+            )
+
+            # Уменьшаем счетчик студентов по специальности и институту
+            await CounterDAO.record(EnrollmentKey(*key), -1, session=session)
+
+            return True
             
+
+    @classmethod
+    async def delete_students(cls, chunk_size: int = 1000, on_chunk: Callable[[int], Awaitable] | None = None,
+                              **filter_by) -> int:
+        # Массовое удаление по фильтру порциями. Каждая порция - отдельная короткая транзакция:
+        # DELETE по id из подзапроса с LIMIT и одна сгруппированная запись в журнал счётчиков.
+        # Блокировки держатся только на время порции, а прерванное удаление оставляет
+        # согласованные счётчики и продолжается повторным запросом.
+        # on_chunk получает количество удалённых после каждой порции (прогресс фоновой задачи)
+        if not filter_by:
+            raise BadRequestError("Необходимо указать хотя бы один фильтр для удаления студентов")
+
+        conditions = cls._filter_conditions(**filter_by)
+        deleted = 0
+        last_id = 0
+        with batched():
+            while True:
+                chunk_ids = (
+                    select(cls.model.id)
+                    .where(*conditions, cls.model.id > last_id)
+                    .order_by(cls.model.id)
+                    .limit(chunk_size)
+                )
+                stmt = (
+                    sqlalchemy_delete(cls.model)
+                    .where(cls.model.id.in_(chunk_ids.scalar_subquery()))
+                    .returning(cls.model.id, cls.model.major_id, cls.model.institute_id,
+                               cls.model.course, cls.model.enrollment_year)
+                )
+                async with session_scope() as session:
+                    rows = (await session.execute(stmt)).all()
+                    if not rows:
+                        return deleted
+                    deltas: Counter[EnrollmentKey] = Counter()
+                    for _, *key in rows:
+                        deltas[EnrollmentKey(*key)] -= 1
+                    await CounterDAO.record_many(deltas, session=session)
+                deleted += len(rows)
+                if on_chunk is not None:
+                    await on_chunk(deleted)
+                # Следующая порция начинается после последнего удалённого id, без повторного просмотра начала
+                last_id = max(row.id for row in rows)
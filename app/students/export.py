@@ -0,0 +1,53 @@
+import csv
+import io
+import zlib
+from enum import Enum
+
+import orjson
+
+
+class ExportFormat(str, Enum):
+    ndjson = "ndjson"
+    csv = "csv"
+
+
+MEDIA_TYPES = {
+    ExportFormat.ndjson: "application/x-ndjson",
+    ExportFormat.csv: "text/csv; charset=utf-8",
+}
+
+
+async def ndjson_chunks(partitions, columns: tuple[str, ...]):
+    async for rows in partitions:
+        yield b"".join(orjson.dumps(dict(zip(columns, row))) + b"\n" for row in rows)
+
+
+async def csv_chunks(partitions, columns: tuple[str, ...]):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    # Заголовок отправляем сразу, не дожидаясь первой порции строк
+    yield buffer.getvalue().encode()
+    async for rows in partitions:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(rows)
+        yield buffer.getvalue().encode()
+
+
+async def gzip_chunks(chunks):
+    # wbits=31 - формат gzip, сжимаем потоково, не накапливая весь ответ
+    compressor = zlib.compressobj(wbits=31)
+    async for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_chunks(partitions, columns: tuple[str, ...], export_format: ExportFormat, gzip: bool = False):
+    if export_format == ExportFormat.csv:
+        chunks = csv_chunks(partitions, columns)
+    else:
+        chunks = ndjson_chunks(partitions, columns)
+    return gzip_chunks(chunks) if gzip else chunks
@@ -0,0 +1,12 @@
+from app.jobs.runner import JobContext, job_type
+from app.students.dao import StudentDAO
+
+
+@job_type("students.delete", concurrency=2)
+async def delete_students_job(job: JobContext, chunk_size: int = 1000, **filters) -> dict:
+    # Прогресс - количество уже удалённых студентов после каждой порции
+    async def report(deleted: int) -> None:
+        await job.progress(deleted=deleted)
+
+    deleted = await StudentDAO.delete_students(chunk_size=chunk_size, on_chunk=report, **filters)
+    return {"deleted": deleted}
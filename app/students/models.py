@@ -1,5 +1,5 @@
 from datetime import date
-from sqlalchemy import ForeignKey, Text
+from sqlalchemy import ForeignKey, Index, String, Text, literal_column
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.database import Base, int_pk, str_null_true, str_uniq
@@ -25,6 +25,15 @@ class Student(Base):
     major: Mapped["Major"] = relationship("Major", back_populates="students")
     institute: Mapped["Institute"] = relationship("Institute", back_populates="students")
 
+    # Индексы под реальные комбинации фильтров QueryParamsStudent;
+    # составной индекс с major_id первым заодно покрывает внешний ключ на majors
+    __table_args__ = (
+        Index("ix_students_major_id_course_enrollment_year", "major_id", "course", "enrollment_year"),
+        Index("ix_students_institute_id", "institute_id"),
+        Index("ix_students_course_enrollment_year", "course", "enrollment_year"),
+        Index("ix_students_enrollment_year", "enrollment_year"),
+    )
+
     def __str__(self):
         return (f"{self.__class__.__name__}(id={self.id},"
                 f"first_name={self.first_name!r},"
@@ -54,4 +63,21 @@ class Student(Base):
         # Возвращает название специальности для сериализации
         if not self.major:
             return None
-        return self.major.major_name
\ No newline at end of file
+        return self.major.major_name
+
+
+# Строка поиска GET /students/search: имя, фамилия, email и адрес через пробел. Пробел - литерал,
+# а не параметр запроса, иначе выражение в запросе не совпадёт с выражением индекса
+_SPACE = literal_column("' '", String)
+search_document = (
+    Student.first_name + _SPACE + Student.last_name + _SPACE + Student.email + _SPACE + Student.address
+)
+
+# Триграммный GIN-индекс (расширение pg_trgm) ускоряет ILIKE '%...%' по любой части строки.
+# Если расширение недоступно, миграция индекс не создаёт и поиск идёт полным просмотром
+Index(
+    "ix_students_search_trgm",
+    search_document.label("search_document"),
+    postgresql_using="gin",
+    postgresql_ops={"search_document": "gin_trgm_ops"},
+)
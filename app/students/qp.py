@@ -1,9 +1,23 @@
+from typing import Annotated
+
+from fastapi import Query
+
+from app.dao.pagination import LIMIT_DESCRIPTION, MAX_PAGE_SIZE
+
+
+# Общие параметры списков и фоновых операций: объявлены один раз, маршруты ставят только значение по умолчанию
+LimitQuery = Annotated[int | None, Query(ge=1, le=MAX_PAGE_SIZE, description=LIMIT_DESCRIPTION)]
+AfterQuery = Annotated[str | None, Query(description="Курсор из next_cursor предыдущей страницы")]
+BackgroundQuery = Annotated[bool, Query(description="Выполнить в фоне: ответ 202 со ссылкой на статус задачи")]
+StudentFieldsQuery = Annotated[
+    str | None, Query(description="Поля ответа через запятую, например id,first_name,major_name")
+]
 
 
 class QueryParamsStudent:
     def __init__(self, student_id: int | None = None,
-                 major_name: int | None = None,
-                 institute_name: int | None = None,
+                 major_name: str | None = None,
+                 institute_name: str | None = None,
                  course: int | None = None,
                  enrollment_year: int | None = None):
         self.id = student_id
@@ -1,49 +1,249 @@
-from fastapi import APIRouter, Depends, HTTPException
+import orjson
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
 
-from app.students.dao import StudentDAO
-from app.students.qp import QueryParamsStudent
-from app.students.schemas import ReadStudentSchema, StudentSchema
+import app.students.jobs  # noqa: F401 - регистрирует типы фоновых задач студентов
+from app.conditional import conditional_get
+from app.config import settings
+from app.dao.pagination import next_cursor, page_size
+from app.dao.session import ReadSessionDep, SessionDep
+from app.jobs.router import accepted_response
+from app.jobs.runner import job_runner
+from app.serialization import dump_list, json_bytes_response, list_response, page_response
+from app.students.dao import SEARCH_MIN_TERM_LENGTH, StudentDAO
+from app.students.export import MEDIA_TYPES, ExportFormat, export_chunks
+from app.students.qp import AfterQuery, BackgroundQuery, LimitQuery, QueryParamsStudent, StudentFieldsQuery
+from app.students.schemas import (ReadStudentSchema, StudentBatchRequest, StudentBatchSchema, StudentPageSchema,
+                                  StudentSchema, UpdateStudentSchema, students_list_adapter)
 
 
 router = APIRouter(prefix='/students', tags=['Работа со студентами'])
 
+BULK_MAX_ROWS = 50_000
+DELETE_CHUNK_SIZE = 1000
+SEARCH_MAX_RESULTS = 100
+
+
+async def students_page_version(session, limit: int, after: str | None, query_params=None, **_):
+    filters = query_params.to_dict() if query_params is not None else {}
+    return await StudentDAO.page_version(limit=page_size(limit), after=after, session=session, **filters)
+
+
+async def student_version(session, id: int, **_):
+    return await StudentDAO.version(session=session, id=id)
+
+
+def students_page(students, limit: int | None, request: Request) -> Response:
+    cursor = next_cursor(students, page_size(limit))
+    if limit is None:
+        return list_response(students_list_adapter, students, cursor, request)
+    return page_response(students_list_adapter, students, cursor)
+
 
 @router.get("/", summary="Получить всех студентов")
-async def get_all_students() -> list[ReadStudentSchema]:
-    return await StudentDAO.find_all()
+@conditional_get(students_page_version, use_last_modified=False)
+async def get_all_students(
+    request: Request,
+    session: ReadSessionDep,
+    limit: LimitQuery = None,
+    after: AfterQuery = None,
+    fields: StudentFieldsQuery = None,
+) -> StudentPageSchema | list[ReadStudentSchema]:
+    students = await StudentDAO.find_all(limit=page_size(limit), after=after, fields=StudentDAO.parse_fields(fields),
+                                         session=session)
+    return students_page(students, limit, request)
 
 
 @router.get("/get_students_by_filters", summary="Получить студентов по фильтру (фильтрам)")
-async def get_all_students_by_filters(query_params: QueryParamsStudent = Depends()) -> list[ReadStudentSchema]:
-    return await StudentDAO.find_all(**query_params.to_dict())
+@conditional_get(students_page_version, use_last_modified=False)
+async def get_all_students_by_filters(
+    request: Request,
+    session: ReadSessionDep,
+    query_params: QueryParamsStudent = Depends(),
+    limit: LimitQuery = None,
+    after: AfterQuery = None,
+    fields: StudentFieldsQuery = None,
+) -> StudentPageSchema | list[ReadStudentSchema]:
+    students = await StudentDAO.find_all(limit=page_size(limit), after=after, fields=StudentDAO.parse_fields(fields),
+                                         session=session, **query_params.to_dict())
+    return students_page(students, limit, request)
+
+
+@router.get("/search", summary="Найти студентов по части имени, фамилии, email или адреса")
+async def search_students(
+    session: ReadSessionDep,
+    q: str = Query(min_length=SEARCH_MIN_TERM_LENGTH, max_length=200, description="Слова для поиска через пробел"),
+    limit: int = Query(20, ge=1, le=SEARCH_MAX_RESULTS, description="Сколько лучших совпадений вернуть"),
+    fields: StudentFieldsQuery = None,
+) -> list[ReadStudentSchema]:
+    students = await StudentDAO.search(q, limit=limit, fields=StudentDAO.parse_fields(fields), session=session)
+    return json_bytes_response(dump_list(students_list_adapter, students))
+
+
+def batch_response(students, missing: list[int]) -> Response:
+    # Список уже сериализован быстрым путём, остаётся обернуть его в объект
+    return json_bytes_response(
+        b''.join([b'{"items":', dump_list(students_list_adapter, students),
+                  b',"missing":', orjson.dumps(missing), b'}'])
+    )
+
+
+def check_batch_size(ids: list[int]) -> None:
+    if len(ids) > settings.STUDENTS_BATCH_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"Не более {settings.STUDENTS_BATCH_MAX_IDS} id за один запрос")
+
+
+@router.get("/batch", summary="Получить студентов по списку id")
+async def get_students_batch(
+    session: ReadSessionDep,
+    ids: str = Query(description="id через запятую, например 1,2,3"),
+    fields: StudentFieldsQuery = None,
+) -> StudentBatchSchema:
+    try:
+        parsed_ids = [int(value) for value in ids.split(",") if value.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids должен быть списком целых чисел через запятую")
+    if not parsed_ids:
+        raise HTTPException(status_code=400, detail="Необходимо указать хотя бы один id")
+    check_batch_size(parsed_ids)
+    students, missing = await StudentDAO.find_by_ids(parsed_ids, fields=StudentDAO.parse_fields(fields),
+                                                     session=session)
+    return batch_response(students, missing)
+
+
+@router.post("/batch", summary="Получить студентов по длинному списку id")
+async def post_students_batch(
+    request_data: StudentBatchRequest,
+    session: ReadSessionDep,
+    fields: StudentFieldsQuery = None,
+) -> StudentBatchSchema:
+    check_batch_size(request_data.ids)
+    students, missing = await StudentDAO.find_by_ids(request_data.ids, fields=StudentDAO.parse_fields(fields),
+                                                     session=session)
+    return batch_response(students, missing)
+
+
+@router.get("/export", summary="Выгрузить студентов потоком в NDJSON или CSV")
+async def export_students(
+    query_params: QueryParamsStudent = Depends(),
+    format: ExportFormat = Query(ExportFormat.ndjson, description="Формат выгрузки"),
+    gzip: bool = Query(False, description="Сжимать ответ gzip"),
+    chunk_size: int = Query(1000, ge=100, le=10000, description="Количество строк в одной порции")
+) -> StreamingResponse:
+    partitions = StudentDAO.stream_all(chunk_size=chunk_size, **query_params.to_dict())
+    headers = {"Content-Disposition": f'attachment; filename="students.{format.value}"'}
+    if gzip:
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(
+        export_chunks(partitions, StudentDAO.export_columns, format, gzip=gzip),
+        media_type=MEDIA_TYPES[format],
+        headers=headers
+    )
 
 
 @router.get("/{id}", summary="Получить одного студента по id")
-async def get_student_by_id(id: int) -> ReadStudentSchema | dict:
-    result = await StudentDAO.find_one_or_none(id=id)
+@conditional_get(student_version)
+async def get_student_by_id(
+    request: Request,
+    id: int,
+    session: ReadSessionDep,
+    fields: StudentFieldsQuery = None,
+) -> ReadStudentSchema | dict:
+    parsed_fields = StudentDAO.parse_fields(fields)
+    result = await StudentDAO.find_one_or_none(fields=parsed_fields, session=session, id=id)
     if result is None:
         raise HTTPException(status_code=404, detail=f"Студент с ID {id} не найден")
+    if parsed_fields:
+        return json_bytes_response(orjson.dumps(dict(result)))
     return result
 
 
 @router.post("/add_student", summary="Добавить нового студента")
-async def add_student_handler(student_data: StudentSchema):
-    student_dict = student_data.model_dump()
-    new_student = await StudentDAO.add_student(student_dict)
+async def add_student_handler(student_data: StudentSchema, session: SessionDep):
+    student_dict = student_data.model_dump() | {"major_name": student_data.major_name.value}
+    new_student = await StudentDAO.add_student(student_dict, session=session)
     if new_student:
         return {"message": "Студент успешно добавлен!", "Новый студент": student_data}
     raise HTTPException(status_code=400, detail="Ошибка при добавлении студента")
 
 
+@router.post("/bulk", summary="Массово добавить студентов (JSON-список или NDJSON)")
+async def add_students_bulk_handler(request: Request, session: SessionDep) -> dict:
+    body = await request.body()
+    try:
+        if request.headers.get("content-type", "").startswith("application/x-ndjson"):
+            rows = [orjson.loads(line) for line in body.splitlines() if line.strip()]
+        else:
+            rows = orjson.loads(body)
+    except orjson.JSONDecodeError as e:
+        raise HTTPException(status_code=400, detail=f"Некорректный JSON: {e}")
+    if not isinstance(rows, list) or not rows:
+        raise HTTPException(status_code=400, detail="Ожидается непустой список студентов")
+    if len(rows) > BULK_MAX_ROWS:
+        raise HTTPException(status_code=400, detail=f"Не более {BULK_MAX_ROWS} студентов за один запрос")
+
+    # Невалидные строки не прерывают загрузку, а попадают в список ошибок
+    valid_rows: list[dict] = []
+    row_numbers: list[int] = []
+    errors: list[dict] = []
+    for index, row in enumerate(rows):
+        if not isinstance(row, dict):
+            errors.append({"row": index, "detail": "Строка должна быть JSON-объектом"})
+            continue
+        try:
+            student = StudentSchema.model_validate(row)
+        except ValidationError as e:
+            errors.append({"row": index, "detail": e.errors(include_url=False, include_context=False)})
+            continue
+        valid_rows.append(student.model_dump() | {"major_name": student.major_name.value})
+        row_numbers.append(index)
+
+    result = {"inserted": 0, "rejected": 0, "errors": []}
+    if valid_rows:
+        result = await StudentDAO.add_students_bulk(valid_rows, session=session)
+    # Номера строк DAO относятся к списку валидных строк, переводим их в номера исходного запроса
+    errors.extend({**error, "row": row_numbers[error["row"]]} for error in result["errors"])
+    errors.sort(key=lambda error: error["row"])
+    return {
+        "message": f"Добавлено студентов: {result['inserted']}",
+        "inserted": result["inserted"],
+        "rejected": len(errors),
+        "errors": errors
+    }
+
+
 @router.put("/update_student", summary="Обновить информацию о студенте")
-async def update_student_handler(student: ReadStudentSchema):
-    check = await StudentDAO.update(student)
+async def update_student_handler(student: UpdateStudentSchema, session: SessionDep):
+    major_id, institute_id = await StudentDAO.reference_ids(student.major_name.value, student.institute_name)
+    values = student.model_dump(exclude={"id", "major_name", "institute_name"})
+    values.update(major_id=major_id, institute_id=institute_id)
+    check = await StudentDAO.update_student(student.id, session=session, **values)
     if check:
         return {"message": "Информация о студенте успешно обновлена!"}
     raise HTTPException(status_code=400, detail="Ошибка при обновлении информации о студенте")
 
 
 @router.delete("/{student_id}", summary="Удалить студента по id")
-async def delete_student_handler(student_id: int) -> dict:
-    await StudentDAO.delete_student(id=student_id)
+async def delete_student_handler(student_id: int, session: SessionDep) -> dict:
+    await StudentDAO.delete_student(session=session, id=student_id)
     return {"message": f"Студент с ID {student_id} успешно удален!"}
+
+
+@router.delete("", summary="Удалить студентов по фильтру (например, выпустившийся курс)")
+async def delete_students_handler(
+    course: int | None = Query(None, ge=1, le=5),
+    enrollment_year: int | None = Query(None),
+    major_id: int | None = Query(None),
+    background: BackgroundQuery = False,
+) -> dict:
+    filters = {key: value for key, value in
+               {"course": course, "enrollment_year": enrollment_year, "major_id": major_id}.items()
+               if value is not None}
+    if not filters:
+        raise HTTPException(status_code=400, detail="Необходимо указать хотя бы один фильтр")
+    if background:
+        job = await job_runner.submit("students.delete", chunk_size=DELETE_CHUNK_SIZE, **filters)
+        return accepted_response(job)
+    deleted = await StudentDAO.delete_students(chunk_size=DELETE_CHUNK_SIZE, **filters)
+    return {"message": f"Удалено студентов: {deleted}", "deleted": deleted}
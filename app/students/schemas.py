@@ -1,6 +1,6 @@
 import re
 from datetime import date, datetime
-from pydantic import BaseModel, ConfigDict, EmailStr, Field, field_validator, model_validator
+from pydantic import BaseModel, ConfigDict, EmailStr, Field, TypeAdapter, field_validator, model_validator
 from app.enums import MajorEnum
 
 
@@ -22,6 +22,9 @@ class StudentSchema(BaseModel):
 
     @model_validator(mode="before")
     def check_names_present(cls, values):
+        # Не словарь (например, строка массовой загрузки) отклонит сама pydantic
+        if not isinstance(values, dict):
+            return values
         if not values.get("major_name"):
             raise ValueError("major_name обязателен")
         if not values.get("institute_name"):
@@ -45,6 +48,42 @@ class StudentSchema(BaseModel):
 
 
 class ReadStudentSchema(BaseModel):
+    # Схема ответа без ограничений StudentSchema: данные уже лежат в БД
     id: int
-    student_data: StudentSchema
+    first_name: str
+    last_name: str
+    date_of_birth: date
+    phone_number: str
+    email: str
+    address: str
+    enrollment_year: int
+    course: int
+    special_notes: str | None = None
+    major_id: int
+    institute_id: int
+    major_name: str | None = Field(None, description="Название специальности")
 
+    model_config = ConfigDict(from_attributes=True)
+
+
+class UpdateStudentSchema(StudentSchema):
+    # Тело PUT /students/update_student: те же проверки, что и при добавлении, плюс id
+    id: int
+
+
+class StudentPageSchema(BaseModel):
+    items: list[ReadStudentSchema]
+    next_cursor: str | None = Field(None, description="Курсор следующей страницы, если она есть")
+
+
+class StudentBatchRequest(BaseModel):
+    ids: list[int] = Field(min_length=1, description="id студентов; порядок сохраняется в ответе")
+
+
+class StudentBatchSchema(BaseModel):
+    items: list[ReadStudentSchema]
+    missing: list[int] = Field(description="Запрошенные id, которых нет в базе")
+
+
+# Собирается один раз при импорте, используется быстрым путём сериализации списков
+students_list_adapter = TypeAdapter(list[ReadStudentSchema])
@@ -0,0 +1,94 @@
+"""Пропускная способность параллельных зачислений на одну специальность.
+
+Сравнивает прежнюю схему (UPDATE горячих строк majors/institutes внутри транзакции записи)
+с журналом enrollment_deltas. Нужна локальная PostgreSQL с применёнными миграциями
+и хотя бы одним институтом (POST /majors/sync-enums). Счётчики после прогона возвращаются
+к исходным значениям.
+
+    python -m benchmarks.enrollment_counters --concurrency 32 --transactions 100 --hold-ms 5
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from sqlalchemy import select, text
+from sqlalchemy import update as sqlalchemy_update
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app.config import get_db_url, get_engine_options
+from app.counters.dao import CounterDAO, EnrollmentKey
+from app.majors.institutes.models import Institute
+from app.majors.models import Major
+
+
+async def hot_row(session, major_id: int, institute_id: int, delta: int) -> None:
+    await session.execute(
+        sqlalchemy_update(Major).where(Major.id == major_id)
+        .values(count_students=Major.count_students + delta)
+    )
+    await session.execute(
+        sqlalchemy_update(Institute).where(Institute.id == institute_id)
+        .values(count_students=Institute.count_students + delta)
+    )
+
+
+async def deltas(session, major_id: int, institute_id: int, delta: int) -> None:
+    await CounterDAO.record(EnrollmentKey(major_id, institute_id, 1, 2023), delta, session=session)
+
+
+STRATEGIES = {"hot_row": hot_row, "deltas": deltas}
+
+
+async def run_strategy(session_maker, strategy, major_id: int, institute_id: int,
+                       concurrency: int, transactions: int, hold: float) -> dict:
+    async def worker():
+        for _ in range(transactions):
+            async with session_maker() as session:
+                async with session.begin():
+                    await strategy(session, major_id, institute_id, 1)
+                    # Остальная работа транзакции записи (INSERT студента и т.п.)
+                    await session.execute(text("SELECT pg_sleep(:hold)"), {"hold": hold})
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    total = concurrency * transactions
+    async with session_maker() as session:
+        async with session.begin():
+            await strategy(session, major_id, institute_id, -total)
+            await CounterDAO.fold(session=session)
+    return {"transactions": total, "seconds": round(elapsed, 3), "tps": round(total / elapsed, 1)}
+
+
+async def main(args) -> dict:
+    options = get_engine_options()
+    options.update(pool_size=args.concurrency, max_overflow=0)
+    engine = create_async_engine(get_db_url(), **options)
+    session_maker = async_sessionmaker(engine, expire_on_commit=False)
+
+    async with session_maker() as session:
+        result = await session.execute(select(Institute.major_id, Institute.id).limit(1))
+        row = result.first()
+    if row is None:
+        raise SystemExit("Нет ни одного института: выполните POST /majors/sync-enums")
+    major_id, institute_id = row
+
+    results = {}
+    for name in args.strategies:
+        results[name] = await run_strategy(
+            session_maker, STRATEGIES[name], major_id, institute_id,
+            args.concurrency, args.transactions, args.hold_ms / 1000
+        )
+    await engine.dispose()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--transactions", type=int, default=100, help="транзакций на одного воркера")
+    parser.add_argument("--hold-ms", type=float, default=5, help="длительность остальной части транзакции")
+    parser.add_argument("--strategies", nargs="+", choices=list(STRATEGIES), default=list(STRATEGIES))
+    print(json.dumps(asyncio.run(main(parser.parse_args())), ensure_ascii=False, indent=2))
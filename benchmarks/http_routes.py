@@ -0,0 +1,453 @@
+"""Нагрузочный прогон всех маршрутов /students и /majors через ASGI-приложение в процессе.
+
+Приложение app.main:app вызывается через httpx.ASGITransport без сети, поэтому в замер
+входят только FastAPI, сериализация и БД. Нужна локальная PostgreSQL с применёнными
+миграциями: перед прогоном таблица students дополняется до --students строк теми же
+детерминированными студентами, что создаёт python -m app.seed. Записи, созданные
+прогоном (префикс bench-<run>), удаляются самими сценариями DELETE; массовое
+DELETE /students удаляет только студентов специально созданных для него специальностей.
+POST /majors/sync-enums без dry_run приводит справочники к enums и удаляет чужие
+специальности, поэтому замеряется только с --with-sync.
+
+Для каждого маршрута: p50/p95/p99 задержки, RPS, доля ошибок и число SQL-запросов на запрос.
+Результат в JSON; с --baseline добавляется изменение относительно прошлого прогона,
+а код возврата 1 означает, что p95 какого-то маршрута вырос больше --max-regression процентов.
+
+    python -m benchmarks.http_routes --students 100000 --concurrency 16 --requests 500 --output bench.json
+    python -m benchmarks.http_routes --baseline bench.json --max-regression 20
+"""
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import subprocess
+import sys
+import time
+import zlib
+from dataclasses import dataclass, field
+from datetime import date, datetime, timezone
+from typing import Callable
+
+import httpx
+from sqlalchemy import delete as sqlalchemy_delete
+from sqlalchemy import event, func, insert, select
+
+from app.dao.pagination import encode_cursor
+from app.dao.session import session_scope
+from app.database import engine, replica_engines
+from app.main import app
+from app.majors.institutes.models import Institute
+from app.majors.models import Major
+from app.majors.reference_cache import reference_cache
+from app.seed import LAST_NAMES, generate_student, seed_students
+from app.students.models import Student
+
+
+BULK_BATCH = 100
+# Массовое DELETE /students: запросов на сценарий и студентов, удаляемых одним запросом
+BULK_DELETE_REQUESTS = 10
+BULK_DELETE_ROWS = 2000
+# Сколько ждать, пока фоновые задачи удаления дойдут до конца
+BULK_DELETE_TIMEOUT = 300
+
+
+def student_payload(index: int, seed: int, prefix: str) -> dict:
+    # Студент прогона: поля как у app.seed, но свои email и диапазон телефонов, зависящий от префикса
+    student = generate_student(index, seed)
+    student["date_of_birth"] = student["date_of_birth"].isoformat()
+    student["phone_number"] = f"+8{zlib.crc32(prefix.encode()) % 10_000:04d}{index:09d}"
+    student["email"] = f"{prefix}{index}@seed{seed}.example.com"
+    return student
+
+
+@dataclass
+class Context:
+    seed: int
+    prefix: str
+    no_cache: bool
+    rng: random.Random
+    student_ids: list[int] = field(default_factory=list)
+    major_names: list[str] = field(default_factory=list)
+    major_ids: dict[str, int] = field(default_factory=dict)
+    institute_ids: dict[str, int] = field(default_factory=dict)
+    created_students: list[int] = field(default_factory=list)
+    created_majors: list[int] = field(default_factory=list)
+    # Специальности, студенты которых удаляются массовым DELETE /students
+    delete_majors: list[int] = field(default_factory=list)
+    counter: int = 0
+
+    def next_index(self) -> int:
+        self.counter += 1
+        return self.counter
+
+
+@dataclass
+class Scenario:
+    name: str
+    # Строит (method, url, kwargs) для i-го запроса сценария
+    build: Callable[[Context, int], tuple]
+    # Количество запросов: по умолчанию --requests
+    size: Callable[[Context, int], int] | None = None
+    # Подготовка и уборка без замера, выполняются до и после сценария
+    setup: Callable | None = None
+    teardown: Callable | None = None
+
+
+def read_headers(ctx: Context) -> dict:
+    return {"Cache-Control": "no-store"} if ctx.no_cache else {}
+
+
+def random_filters(ctx: Context) -> dict:
+    return {
+        "major_name": ctx.rng.choice(ctx.major_names),
+        "course": ctx.rng.randint(1, 5),
+        "enrollment_year": ctx.rng.randint(2019, 2023),
+    }
+
+
+async def collect_created_students(client, ctx: Context) -> None:
+    async with session_scope() as session:
+        result = await session.execute(
+            select(Student.id).where(Student.email.like(f"{ctx.prefix}%")).order_by(Student.id)
+        )
+        ctx.created_students = list(result.scalars())
+
+
+async def collect_created_majors(client, ctx: Context) -> None:
+    async with session_scope() as session:
+        result = await session.execute(
+            select(Major.id).where(Major.major_name.like(f"{ctx.prefix}%")).order_by(Major.id)
+        )
+        ctx.created_majors = list(result.scalars())
+
+
+async def prepare_bulk_delete(client, ctx: Context) -> None:
+    # У каждого запроса своя специальность bench-... с институтом и BULK_DELETE_ROWS студентами:
+    # DELETE /students?major_id=... не задевает данные, которые не создал прогон
+    async with session_scope() as session:
+        result = await session.execute(
+            insert(Major)
+            .values([{"major_name": f"{ctx.prefix}bulk-delete-{ctx.next_index()}"}
+                     for _ in range(BULK_DELETE_REQUESTS)])
+            .returning(Major.id)
+        )
+        ctx.delete_majors = list(result.scalars())
+        result = await session.execute(
+            insert(Institute)
+            .values([{"institute_name": f"{ctx.prefix}bulk-delete-{major_id}", "major_id": major_id}
+                     for major_id in ctx.delete_majors])
+            .returning(Institute.id)
+        )
+        institute_ids = list(result.scalars())
+        for major_id, institute_id in zip(ctx.delete_majors, institute_ids):
+            rows = []
+            for _ in range(BULK_DELETE_ROWS):
+                student = student_payload(ctx.next_index(), ctx.seed, ctx.prefix)
+                del student["major_name"], student["institute_name"]
+                student["date_of_birth"] = date.fromisoformat(student["date_of_birth"])
+                rows.append({**student, "major_id": major_id, "institute_id": institute_id})
+            await session.execute(insert(Student), rows)
+
+
+async def cleanup_bulk_delete(client, ctx: Context) -> None:
+    # Фоновые задачи удаляют студентов после ответа 202: ждём их, затем убираем специальности
+    deadline = time.monotonic() + BULK_DELETE_TIMEOUT
+    while True:
+        async with session_scope() as session:
+            left = (await session.execute(
+                select(func.count()).select_from(Student).where(Student.major_id.in_(ctx.delete_majors))
+            )).scalar_one()
+        if not left:
+            break
+        if time.monotonic() > deadline:
+            raise SystemExit(f"Массовое удаление не завершилось за {BULK_DELETE_TIMEOUT} с, осталось {left}")
+        await asyncio.sleep(0.5)
+    async with session_scope() as session:
+        await session.execute(sqlalchemy_delete(Institute).where(Institute.major_id.in_(ctx.delete_majors)))
+        await session.execute(sqlalchemy_delete(Major).where(Major.id.in_(ctx.delete_majors)))
+    ctx.delete_majors = []
+
+
+def updated_student(ctx: Context, i: int) -> tuple:
+    student_id = ctx.created_students[i % len(ctx.created_students)]
+    payload = student_payload(student_id, ctx.seed, prefix=f"{ctx.prefix}upd-")
+    payload["id"] = student_id
+    payload["major_id"] = ctx.major_ids[payload["major_name"]]
+    payload["institute_id"] = ctx.institute_ids[payload["institute_name"]]
+    return "PUT", "/students/update_student", {"json": payload}
+
+
+SCENARIOS = [
+    Scenario("GET /students/", lambda ctx, i: (
+        "GET", "/students/", {"params": {"limit": 100}}
+    )),
+    Scenario("GET /students/?after", lambda ctx, i: (
+        "GET", "/students/", {"params": {"limit": 100, "after": encode_cursor(ctx.rng.choice(ctx.student_ids))}}
+    )),
+    Scenario("GET /students/?fields", lambda ctx, i: (
+        "GET", "/students/", {"params": {"limit": 100, "fields": "id,first_name,last_name,major_name"}}
+    )),
+    Scenario("GET /students/get_students_by_filters", lambda ctx, i: (
+        "GET", "/students/get_students_by_filters", {"params": {"limit": 100, **random_filters(ctx)}}
+    )),
+    Scenario("GET /students/search", lambda ctx, i: (
+        "GET", "/students/search", {"params": {"q": ctx.rng.choice(ctx.rng.choice(LAST_NAMES))[:5]}}
+    )),
+    Scenario("GET /students/batch", lambda ctx, i: (
+        "GET", "/students/batch", {"params": {"ids": ",".join(map(str, ctx.rng.sample(ctx.student_ids, min(50, len(ctx.student_ids)))))}}
+    )),
+    Scenario("POST /students/batch", lambda ctx, i: (
+        "POST", "/students/batch",
+        {"json": {"ids": ctx.rng.sample(ctx.student_ids, min(500, len(ctx.student_ids)))}}
+    )),
+    Scenario("GET /students/export", lambda ctx, i: (
+        "GET", "/students/export", {"params": random_filters(ctx)}
+    ), size=lambda ctx, requests: max(1, requests // 20)),
+    Scenario("GET /students/{id}", lambda ctx, i: (
+        "GET", f"/students/{ctx.rng.choice(ctx.student_ids)}", {}
+    )),
+    Scenario("POST /students/add_student", lambda ctx, i: (
+        "POST", "/students/add_student", {"json": student_payload(ctx.next_index(), ctx.seed, ctx.prefix)}
+    )),
+    Scenario("POST /students/bulk", lambda ctx, i: (
+        "POST", "/students/bulk",
+        {"json": [student_payload(ctx.next_index(), ctx.seed, ctx.prefix) for _ in range(BULK_BATCH)]}
+    ), size=lambda ctx, requests: max(1, requests // 10)),
+    Scenario("PUT /students/update_student", updated_student,
+             size=lambda ctx, requests: min(requests, len(ctx.created_students)), setup=collect_created_students),
+    # Удаляет ровно тех студентов, которых добавили сценарии выше
+    Scenario("DELETE /students/{student_id}", lambda ctx, i: (
+        "DELETE", f"/students/{ctx.created_students[i]}", {}
+    ), size=lambda ctx, requests: len(ctx.created_students), setup=collect_created_students),
+    Scenario("DELETE /students", lambda ctx, i: (
+        "DELETE", "/students", {"params": {"major_id": ctx.delete_majors[i]}}
+    ), size=lambda ctx, requests: len(ctx.delete_majors), setup=prepare_bulk_delete, teardown=cleanup_bulk_delete),
+    # Замеряется постановка задачи в очередь (202), уборка дожидается самого удаления
+    Scenario("DELETE /students?background", lambda ctx, i: (
+        "DELETE", "/students", {"params": {"major_id": ctx.delete_majors[i], "background": "true"}}
+    ), size=lambda ctx, requests: len(ctx.delete_majors), setup=prepare_bulk_delete, teardown=cleanup_bulk_delete),
+
+    Scenario("GET /majors/", lambda ctx, i: (
+        "GET", "/majors/", {"params": {"limit": 100}, "headers": read_headers(ctx)}
+    )),
+    Scenario("GET /majors", lambda ctx, i: (
+        "GET", "/majors", {"params": {"major_name": ctx.rng.choice(ctx.major_names)}, "headers": read_headers(ctx)}
+    )),
+    Scenario("POST /majors", lambda ctx, i: (
+        "POST", "/majors", {"json": {"major_name": f"{ctx.prefix}major-{ctx.next_index()}"}}
+    )),
+    Scenario("PUT /majors/{major_id}", lambda ctx, i: (
+        "PUT", f"/majors/{ctx.created_majors[i % len(ctx.created_majors)]}",
+        {"json": {"major_name": f"{ctx.prefix}major-{ctx.next_index()}"}}
+    ), size=lambda ctx, requests: min(requests, len(ctx.created_majors)), setup=collect_created_majors),
+    Scenario("PATCH /majors/{major_id}", lambda ctx, i: (
+        "PATCH", f"/majors/{ctx.created_majors[i % len(ctx.created_majors)]}",
+        {"json": {"major_name": f"{ctx.prefix}major-{ctx.next_index()}"}}
+    ), size=lambda ctx, requests: min(requests, len(ctx.created_majors)), setup=collect_created_majors),
+    # Половина созданных специальностей удаляется по id, остальные - диапазонами из одного id
+    Scenario("DELETE /majors/{major_id}", lambda ctx, i: (
+        "DELETE", f"/majors/{ctx.created_majors[i]}", {}
+    ), size=lambda ctx, requests: (len(ctx.created_majors) + 1) // 2, setup=collect_created_majors),
+    Scenario("DELETE /majors", lambda ctx, i: (
+        "DELETE", "/majors", {"params": {"start_id": ctx.created_majors[i], "end_id": ctx.created_majors[i]}}
+    ), size=lambda ctx, requests: len(ctx.created_majors), setup=collect_created_majors),
+    Scenario("POST /majors/sync-enums?dry_run", lambda ctx, i: (
+        "POST", "/majors/sync-enums", {"params": {"dry_run": "true"}}
+    )),
+]
+
+# Меняют справочники: удаляют специальности и институты, которых нет в enums
+SYNC_SCENARIOS = [
+    Scenario("POST /majors/sync-enums", lambda ctx, i: (
+        "POST", "/majors/sync-enums", {}
+    )),
+    Scenario("POST /majors/sync-enums?background", lambda ctx, i: (
+        "POST", "/majors/sync-enums", {"params": {"background": "true"}}
+    )),
+]
+
+
+class QueryCounter:
+    # Считает все SQL-запросы к primary и репликам за время сценария
+    def __init__(self):
+        self.count = 0
+        self.engines = [engine.sync_engine] + [e.sync_engine for e in replica_engines]
+
+    def on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+    def __enter__(self):
+        for sync_engine in self.engines:
+            event.listen(sync_engine, "before_cursor_execute", self.on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        for sync_engine in self.engines:
+            event.remove(sync_engine, "before_cursor_execute", self.on_execute)
+
+
+def percentile(sorted_values: list[float], p: float) -> float:
+    index = min(len(sorted_values) - 1, max(0, round(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+async def run_scenario(client: httpx.AsyncClient, ctx: Context, scenario: Scenario,
+                       requests: int, concurrency: int) -> dict:
+    if scenario.setup is not None:
+        await scenario.setup(client, ctx)
+    total = scenario.size(ctx, requests) if scenario.size else requests
+    if total <= 0:
+        return {"requests": 0}
+
+    latencies: list[float] = []
+    errors = 0
+    # Запросы строятся заранее, чтобы генерация данных не попадала в замер
+    calls = [scenario.build(ctx, i) for i in range(total)]
+    queue = iter(calls)
+
+    async def worker():
+        nonlocal errors
+        for method, url, kwargs in queue:
+            started = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            await response.aread()
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+
+    with QueryCounter() as queries:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(min(concurrency, total))))
+        elapsed = time.perf_counter() - started
+    if scenario.teardown is not None:
+        await scenario.teardown(client, ctx)
+
+    latencies.sort()
+    return {
+        "requests": total,
+        "errors": errors,
+        "rps": round(total / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 2),
+        "queries_per_request": round(queries.count / total, 2),
+    }
+
+
+async def ensure_dataset(students: int, seed: int) -> int:
+    async with session_scope() as session:
+        existing = (await session.execute(select(func.count()).select_from(Student))).scalar_one()
+    # Дополняем таблицу теми же детерминированными студентами, что и python -m app.seed
+    if existing < students:
+        await seed_students(students - existing, seed=seed, offset=existing, method="insert")
+        # --method insert пропускает строки, занятые прошлыми прогонами, поэтому проверяем итог
+        async with session_scope() as session:
+            existing = (await session.execute(select(func.count()).select_from(Student))).scalar_one()
+        if existing < students:
+            raise SystemExit(f"В таблице students {existing} строк вместо {students}: часть студентов "
+                             f"с --seed {seed} уже занята, запустите с другим --seed")
+    return existing
+
+
+async def build_context(args, run_id: str) -> Context:
+    ctx = Context(seed=args.seed, prefix=f"bench-{run_id}-", no_cache=args.no_cache, rng=random.Random(args.seed))
+    reference = await reference_cache.get(force=True)
+    ctx.major_ids = dict(reference.major_ids)
+    ctx.institute_ids = dict(reference.institute_ids)
+    ctx.major_names = sorted(name for name in reference.major_ids if not name.startswith("bench-"))
+    async with session_scope() as session:
+        result = await session.execute(select(Student.id).order_by(Student.id).limit(10_000))
+        ctx.student_ids = list(result.scalars())
+    if not ctx.student_ids:
+        raise SystemExit("В таблице students нет строк")
+    return ctx
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: dict, baseline: dict) -> dict:
+    # Изменение в процентах относительно базового прогона: + для задержки - хуже, для rps - лучше
+    diff = {}
+    for name, current in results["routes"].items():
+        previous = baseline.get("routes", {}).get(name)
+        if not previous or not current.get("requests") or not previous.get("requests"):
+            continue
+        diff[name] = {
+            metric: round((current[metric] - previous[metric]) / previous[metric] * 100, 1)
+            for metric in ("p50_ms", "p95_ms", "p99_ms", "rps", "queries_per_request")
+            if previous.get(metric)
+        }
+    return diff
+
+
+async def main(args) -> dict:
+    run_id = datetime.now(timezone.utc).strftime("%Y%m%d%H%M%S")
+    # Необработанные исключения приложения считаются ошибками (500), а не прерывают прогон
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            dataset = await ensure_dataset(args.students, args.seed)
+            ctx = await build_context(args, run_id)
+            routes = {}
+            for scenario in SCENARIOS + (SYNC_SCENARIOS if args.with_sync else []):
+                if args.only and args.only not in scenario.name:
+                    continue
+                routes[scenario.name] = await run_scenario(client, ctx, scenario, args.requests, args.concurrency)
+                print(f"{scenario.name}: {routes[scenario.name]}", file=sys.stderr)
+    await engine.dispose()
+    return {
+        "meta": {
+            "run": run_id,
+            "revision": git_revision(),
+            "students": dataset,
+            "with_sync": args.with_sync,
+            "seed": args.seed,
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "no_cache": args.no_cache,
+        },
+        "routes": routes,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--students", type=int, default=10_000, help="Минимальный размер таблицы students")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=200, help="Запросов на маршрут")
+    parser.add_argument("--no-cache", action="store_true", help="Читать /majors в обход кэша ответов")
+    parser.add_argument("--only", help="Только сценарии, в названии которых есть эта строка")
+    parser.add_argument("--with-sync", action="store_true",
+                        help="Замерить и POST /majors/sync-enums без dry_run: приводит справочники к enums")
+    parser.add_argument("--output", help="Сохранить результаты в JSON-файл")
+    parser.add_argument("--baseline", help="JSON прошлого прогона для сравнения")
+    parser.add_argument("--max-regression", type=float, default=None,
+                        help="Допустимый рост p95 в процентах относительно --baseline")
+    args = parser.parse_args()
+
+    results = asyncio.run(main(args))
+    exit_code = 0
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            results["diff"] = compare(results, json.load(f))
+        if args.max_regression is not None:
+            regressed = [name for name, diff in results["diff"].items()
+                         if diff.get("p95_ms", 0) > args.max_regression]
+            if regressed:
+                print(f"p95 вырос больше чем на {args.max_regression}%: {', '.join(regressed)}", file=sys.stderr)
+                exit_code = 1
+    output = json.dumps(results, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    print(output)
+    sys.exit(exit_code)
@@ -0,0 +1,143 @@
+"""Проверка планов запросов DAO: ни один запрос не должен читать большие таблицы Seq Scan.
+
+Выполняет вызовы DAO, которые делают маршруты API, на локальной БД с применёнными миграциями и данными,
+перехватывает отправленный SQL и выполняет для каждого SELECT
+EXPLAIN с enable_seqscan = off: если последовательное чтение остаётся и так,
+подходящего индекса нет. Код возврата 1, если найдены такие запросы.
+
+    python -m benchmarks.query_plans
+"""
+import argparse
+import asyncio
+import json
+import sys
+
+from sqlalchemy import event
+
+from app.dao.pagination import encode_cursor, page_size
+from app.database import engine, replica_engines
+from app.enums import MajorEnum, institutes_enum
+from app.majors.dao import MajorDAO
+from app.majors.qp import QueryParamsMajor
+from app.majors.router import majors_page_version
+from app.students.dao import StudentDAO
+from app.students.qp import QueryParamsStudent
+from app.students.router import student_version, students_page_version
+
+
+LARGE_TABLES = {"students", "enrollment_deltas"}
+
+# Фильтры в том виде, в каком их собирают маршруты: имена специальности и института
+# превращаются в EXISTS-подзапросы в StudentDAO._filter_conditions
+MAJOR_NAME = MajorEnum.law.value
+INSTITUTE_NAME = institutes_enum[MajorEnum.law][0]
+STUDENT_FILTERS = {
+    "major_name": QueryParamsStudent(major_name=MAJOR_NAME),
+    "institute_name": QueryParamsStudent(institute_name=INSTITUTE_NAME),
+    "course и enrollment_year": QueryParamsStudent(course=3, enrollment_year=2020),
+    "major_name, course и enrollment_year": QueryParamsStudent(major_name=MAJOR_NAME, course=3, enrollment_year=2020),
+}
+NEXT_PAGE = encode_cursor(1000)
+
+
+async def export(query_params: QueryParamsStudent):
+    # /students/export: stream_all открывает серверный курсор, достаточно первой порции
+    async for _ in StudentDAO.stream_all(chunk_size=1000, **query_params.to_dict()):
+        break
+
+
+def student_cases() -> dict:
+    cases = {
+        "GET /students/": lambda: StudentDAO.find_all(limit=page_size(None)),
+        "GET /students/?after": lambda: StudentDAO.find_all(limit=page_size(None), after=NEXT_PAGE),
+        "ETag /students/": lambda: students_page_version(None, None, None),
+        "ETag /students/?after": lambda: students_page_version(None, None, NEXT_PAGE),
+        "GET /students/{id}": lambda: StudentDAO.find_one_or_none(id=1),
+        "ETag /students/{id}": lambda: student_version(None, id=1),
+        "GET /students/batch": lambda: StudentDAO.find_by_ids(list(range(1, 101))),
+        "GET /students/search": lambda: StudentDAO.search("Иван Моск", limit=20),
+        "GET /students/export": lambda: export(QueryParamsStudent()),
+    }
+    for name, query_params in STUDENT_FILTERS.items():
+        cases[f"GET /students/get_students_by_filters: {name}"] = (
+            lambda qp=query_params: StudentDAO.find_all(limit=page_size(None), **qp.to_dict())
+        )
+        cases[f"ETag /students/get_students_by_filters: {name}"] = (
+            lambda qp=query_params: students_page_version(None, None, None, query_params=qp)
+        )
+        cases[f"GET /students/export: {name}"] = lambda qp=query_params: export(qp)
+    return cases
+
+
+def major_cases() -> dict:
+    by_institute = QueryParamsMajor(institute_name=INSTITUTE_NAME)
+    return {
+        "GET /majors/": lambda: MajorDAO.find_all_majors(limit=page_size(None)),
+        "ETag /majors/": lambda: majors_page_version(None, None, None),
+        "GET /majors: institute_name": lambda: MajorDAO.find_all_majors(limit=page_size(None),
+                                                                        **by_institute.to_dict()),
+        "ETag /majors: institute_name": lambda: majors_page_version(None, None, None, query_params=by_institute),
+    }
+
+
+# Те же вызовы DAO и те же фильтры, что делают маршруты
+CASES = {**student_cases(), **major_cases()}
+
+
+def seq_scans(plan: dict) -> list[str]:
+    found = []
+    if plan.get("Node Type") == "Seq Scan" and plan.get("Relation Name") in LARGE_TABLES:
+        found.append(plan["Relation Name"])
+    for child in plan.get("Plans", []):
+        found.extend(seq_scans(child))
+    return found
+
+
+async def capture(call) -> list[tuple[str, object]]:
+    statements = []
+
+    def on_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    engines = [engine.sync_engine] + [e.sync_engine for e in replica_engines]
+    for sync_engine in engines:
+        event.listen(sync_engine, "before_cursor_execute", on_execute)
+    try:
+        await call()
+    finally:
+        for sync_engine in engines:
+            event.remove(sync_engine, "before_cursor_execute", on_execute)
+    return statements
+
+
+async def explain(statement: str, parameters) -> dict:
+    async with engine.connect() as conn:
+        async with conn.begin():
+            await conn.exec_driver_sql("SET LOCAL enable_seqscan = off")
+            result = await conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters)
+            plan = result.scalar_one()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]["Plan"]
+
+
+async def main(args) -> int:
+    failures = 0
+    for name, call in CASES.items():
+        for statement, parameters in await capture(call):
+            scans = seq_scans(await explain(statement, parameters))
+            if scans:
+                failures += 1
+                print(f"FAIL {name}: Seq Scan по {', '.join(sorted(set(scans)))}\n    {' '.join(statement.split())}")
+            elif args.verbose:
+                print(f"ok   {name}: {' '.join(statement.split())[:120]}")
+    await engine.dispose()
+    print(f"Запросов с последовательным чтением больших таблиц: {failures}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-v", "--verbose", action="store_true")
+    sys.exit(asyncio.run(main(parser.parse_args())))
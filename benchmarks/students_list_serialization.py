@@ -0,0 +1,83 @@
+"""Запросов в секунду на GET /students/: стандартная сериализация FastAPI против быстрого пути.
+
+Оба обработчика отдают одну и ту же страницу ORM-объектов Student, собранную в памяти,
+поэтому измеряется только стоимость валидации и сериализации ответа, без БД.
+
+    python -m benchmarks.students_list_serialization --page-size 1000 --seconds 5
+"""
+import argparse
+import asyncio
+import json
+import time
+from datetime import date
+
+import httpx
+from fastapi import FastAPI
+
+from app.dao.pagination import next_cursor
+from app.majors.models import Major
+from app.serialization import page_response
+from app.students.models import Student
+from app.students.schemas import StudentPageSchema, students_list_adapter
+
+
+def build_students(count: int) -> list[Student]:
+    major = Major(id=1, major_name="Информатика")
+    return [
+        Student(
+            id=i, first_name=f"Имя{i}", last_name=f"Фамилия{i}", date_of_birth=date(2000, 1, 1),
+            phone_number=f"+7900{i:07d}", email=f"student{i}@example.com",
+            address=f"г. Москва, ул. Студенческая, д. {i}", enrollment_year=2020, course=i % 5 + 1,
+            special_notes=None, major_id=1, institute_id=1, major=major,
+        )
+        for i in range(1, count + 1)
+    ]
+
+
+def build_app(students: list[Student], limit: int) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/standard")
+    async def standard() -> StudentPageSchema:
+        return {"items": students, "next_cursor": next_cursor(students, limit)}
+
+    @app.get("/fast")
+    async def fast() -> StudentPageSchema:
+        return page_response(students_list_adapter, students, next_cursor(students, limit))
+
+    return app
+
+
+async def measure(client: httpx.AsyncClient, path: str, seconds: float) -> dict:
+    # Прогрев, затем последовательные запросы в течение seconds
+    await client.get(path)
+    count = 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        response = await client.get(path)
+        response.raise_for_status()
+        count += 1
+    elapsed = time.perf_counter() - started
+    return {"requests": count, "rps": round(count / elapsed, 1), "bytes": len(response.content)}
+
+
+async def main(args) -> dict:
+    students = build_students(args.page_size)
+    app = build_app(students, args.page_size)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench") as client:
+        standard = await client.get("/standard")
+        fast = await client.get("/fast")
+        assert json.loads(standard.content) == json.loads(fast.content), "ответы различаются"
+        results = {
+            "standard": await measure(client, "/standard", args.seconds),
+            "fast": await measure(client, "/fast", args.seconds),
+        }
+    results["speedup"] = round(results["fast"]["rps"] / results["standard"]["rps"], 2)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--page-size", type=int, default=1000)
+    parser.add_argument("--seconds", type=float, default=5)
+    print(json.dumps(asyncio.run(main(parser.parse_args())), ensure_ascii=False, indent=2))